@@ -0,0 +1,187 @@
+import bisect
+from array import array
+import time_utils as time_utils
+import forecast_grid as forecast_grid
+import forecast_model as forecast_model
+import calculations as calculations
+
+def reduce_bucket(values, start, stop, extremes, samples=False):
+    '''Reduce hourly values of a bucket of a stacked array
+    Args:
+        values (array) : stacked hourly values, NaN for missing hours
+        start (int) : first index of the bucket
+        stop (int) : index after the bucket
+        extremes (bool) : find the first maximum and minimum, one pass each
+        samples (bool) : keep the values of the hours with values
+    Returns:
+        partial (tuple) : (count, sum, max index, max, min index, min[, values]), indexes into values,
+                          extremes None if not requested or the bucket has no values
+    '''
+    bucket = values[start:stop]
+    total = sum(bucket)
+    if total != total:
+        # Missing hours, reduce the hours with values only
+        hours = [hour for hour in range(len(bucket)) if bucket[hour] == bucket[hour]]
+        total = sum(bucket[hour] for hour in hours)
+    else:
+        hours = range(len(bucket))
+    if not extremes or len(hours) == 0:
+        partial = (len(hours), total, None, None, None, None)
+    else:
+        high = max(hours, key=bucket.__getitem__)
+        low = min(hours, key=bucket.__getitem__)
+        partial = (len(hours), total, start + high, bucket[high], start + low, bucket[low])
+    if samples:
+        partial += ([bucket[hour] for hour in hours],)
+    return partial
+
+def combine_buckets(partials, steps, time, units=None):
+    '''Combine bucket partials of a time period, in time order, and run the reducers of a plan
+    Args:
+        partials (list) : bucket partials, see reduce_bucket
+        steps (list) : reducers to run, see CalculationPlan.get_steps
+        time (callable) : (index) -> start of the hour, seconds since epoch
+        units (str) : units of the values
+    Returns:
+        result (dict) : {'count': hours with values, calculation: value}, extremes are (time, value)
+                        of the first hour of the extreme
+    '''
+    count = 0
+    total = 0.0
+    high = None
+    low = None
+    for partial in partials:
+        if partial[0] == 0:
+            continue
+        count += partial[0]
+        total += partial[1]
+        if partial[2] != None and (high == None or partial[3] > high[1]):
+            high = (partial[2], partial[3])
+        if partial[4] != None and (low == None or partial[5] < low[1]):
+            low = (partial[4], partial[5])
+    result = {'count': count}
+    if count == 0:
+        return result
+    if high != None:
+        high = (time(high[0]), high[1])
+        low = (time(low[0]), low[1])
+    samples = None
+    if len(partials[0]) > 6:
+        samples = [value for partial in partials for value in partial[6]]
+    for step in steps:
+        result[step.name] = step.fn(count, total, high, low, samples, units)
+    return result
+
+def get_period_index(time, time_periods):
+    '''Return the period bucket index of a run'''
+    day_index = time_utils.get_day_index(time)
+    return PeriodIndex(day_index, forecast_grid.get_hourly_grid(day_index), time_periods)
+
+def aggregate_forecasts(time, time_periods, properties, forecasts, slices=None):
+    '''Compute the configured calculations of all locations, days and time periods in one batch
+    Locations of a run share the hourly grid, so the hourly values of a property are stacked
+    into one contiguous array and every (location, day, time period) is a fixed offset into it.
+    Args:
+        time (datetime) : current time
+        time_periods (dict) : {day: [time_period1, time_period2, ...]}
+        properties (dict) : {property: {'units': units, 'calculations': [calculation1, calculation2, ...]}}
+        forecasts (dict) : {location: Forecast}, see TableData.parse_forecast
+        slices (dict) : Optional, {location: {property: [day]}} to compute, e.g., changed since the previous
+                        run, see ForecastState.get_slices; all days of all properties if None
+    Returns:
+        aggregates (dict) : {location: {property: {(day, time period): result}}}, see combine_buckets;
+                            weather results are {'count': hours, 'data': [(time, conditions)]}
+    '''
+    period_index = get_period_index(time, time_periods)
+    plan = calculations.get_plan(properties)
+    grid = period_index.get_grid()
+    hours = grid.get_hours()
+    first = grid.get_start()
+    buckets = period_index.get_buckets()
+    segments = period_index.get_segments()
+    aggregates = {location: {} for location in forecasts.keys()}
+
+    for property, config in properties.items():
+        locations = [location for location, forecast in forecasts.items()
+                     if property in forecast.predictions and forecast.start == first and forecast.hours == hours]
+        if slices != None:
+            locations = [location for location in locations if len(slices.get(location, {}).get(property, [])) > 0]
+        keys = {location: [key for key in segments.keys() if slices == None or key[0] in slices[location][property]]
+                for location in locations}
+
+        if property == 'weather':
+            # Weather conditions of each hour with weather, hours of each bucket are visited once
+            for location in locations:
+                codes = forecasts[location].predictions[property].values
+                partials = {i: [(first + hour * forecast_grid.HOUR, forecast_model.get_weather(codes[hour])) for hour in buckets[i] if codes[hour] != 0]
+                            for i in sorted(set(i for key in keys[location] for i in segments[key]))}
+                aggregates[location][property] = {key: {'count': sum(len(partials[i]) for i in segments[key]),
+                                                        'data': [value for i in segments[key] for value in partials[i]]}
+                                                  for key in keys[location]}
+            continue
+
+        steps = plan.get_steps(property)
+        extremes = plan.needs_extremes(property)
+        samples = plan.needs_values(property)
+        stacked = array('d')
+        for location in locations:
+            stacked.extend(forecasts[location].predictions[property].values)
+        for row, location in enumerate(locations):
+            offset = row * hours
+            units = forecasts[location].predictions[property].units
+            hour_time = lambda index, offset=offset: first + (index - offset) * forecast_grid.HOUR
+            partials = {i: reduce_bucket(stacked, offset + buckets[i].start, offset + buckets[i].stop, extremes, samples)
+                        for i in sorted(set(i for key in keys[location] for i in segments[key]))}
+            aggregates[location][property] = {key: combine_buckets([partials[i] for i in segments[key]], steps, hour_time, units)
+                                              for key in keys[location]}
+
+    return aggregates
+
+
+
+class PeriodIndex:
+    '''Bucket index of the configured days and time periods of a run
+    The hours of all configured periods are cut into disjoint buckets at every period boundary,
+    e.g., the am, pm and overnight buckets of a day together form its 24h period. Values are
+    reduced once per bucket and periods combine the partials of their buckets, so each hour is
+    visited once however many periods include it.
+    '''
+
+    def __init__(self, day_index, grid, time_periods):
+        '''Initialize PeriodIndex object
+        Args:
+            day_index (DayIndex) : forecast day boundaries
+            grid (HourlyGrid) : hourly grid of the run
+            time_periods (dict) : {day: [time_period1, time_period2, ...]}
+        Returns:
+            None
+        '''
+        self._grid = grid
+        groups = day_index.get_groups()
+        spans = {}
+        for day, periods in time_periods.items():
+            if day not in groups:
+                continue
+            # The 24h period of each day is always indexed, it tells whether the day has values
+            for period in ['24h'] + [period for period in periods if period != '24h']:
+                spans[(day, period)] = grid.span(*day_index.get_period(groups.index(day), period))
+
+        # Cut hours at every period boundary, keep buckets inside some period
+        cuts = sorted(set(hour for span in spans.values() for hour in (span.start, span.stop)))
+        self._buckets = [range(start, stop) for start, stop in zip(cuts, cuts[1:])
+                         if any(span.start <= start and stop <= span.stop for span in spans.values())]
+        starts = [bucket.start for bucket in self._buckets]
+        self._segments = {key: list(range(bisect.bisect_left(starts, span.start), bisect.bisect_left(starts, span.stop)))
+                          for key, span in spans.items()}
+
+    def get_grid(self):
+        '''Return hourly grid'''
+        return self._grid
+
+    def get_buckets(self):
+        '''Return buckets, disjoint ranges of hours in time order'''
+        return self._buckets
+
+    def get_segments(self):
+        '''Return buckets of each period, {(day, time period): [bucket index]}'''
+        return self._segments
@@ -0,0 +1,248 @@
+import json
+import gzip
+import bisect
+import logging
+from datetime import datetime, timezone
+from time_utils import parse_valid_time
+
+# Version of the archived snapshot format
+ARCHIVE_FORMAT_VERSION = 1
+
+def to_epoch(time):
+    '''Return seconds since epoch of a timezone aware datetime, ISO 8601 string or number'''
+    if isinstance(time, str):
+        time = datetime.fromisoformat(time.replace('Z', '+00:00'))
+    if isinstance(time, datetime):
+        return int(time.timestamp())
+    return int(time)
+
+def snapshot_columns(properties):
+    '''Convert gridData properties to columns
+    Args:
+        properties (dict) : gridData properties, {property: {'uom': uom, 'values': [{'validTime': ..., 'value': ...}]}}
+    Returns:
+        columns (dict) : {property: {'uom': uom, 'start': [epoch], 'seconds': [duration], 'value': [value]}},
+                         values sorted by start
+    '''
+    columns = {}
+    for property, data in properties.items():
+        if not isinstance(data, dict) or 'values' not in data:
+            continue
+        rows = sorted((parse_valid_time(value['validTime']) + (value['value'],) for value in data['values']), key=lambda row: row[0])
+        columns[property] = {'uom': data.get('uom'),
+                             'start': [row[0] for row in rows],
+                             'seconds': [row[1] for row in rows],
+                             'value': [row[2] for row in rows]}
+    return columns
+
+
+
+class Archive:
+    '''Append-only archive of forecast snapshots with point-in-time queries
+    Snapshots are partitioned by location and issue month:
+        {prefix}/{location}/partitions.json              sorted issue months
+        {prefix}/{location}/{YYYY-MM}/index.json         sorted [issue time, snapshot blob] of the month
+        {prefix}/{location}/{YYYY-MM}/{issued}.json.gz   columnar, gzip compressed snapshot
+    A query as of a time reads the partition list, one monthly index and one snapshot, and
+    locates the issue and the valid times by bisection, so query cost does not grow with the
+    number of archived snapshots. Snapshots are never overwritten; index updates are
+    conditional writes, retried on conflict.
+    '''
+
+    def __init__(self, blob_storage, container_name='skiforecast', prefix='archive'):
+        '''Initialize Archive object
+        Args:
+            blob_storage (StorageSession) : storage backend, see storage.get_storage
+            container_name (str) : name of container
+            prefix (str) : blob name prefix
+        Returns:
+            None
+        '''
+        self._storage = blob_storage
+        self._container_name = container_name
+        self._prefix = prefix
+        self._cache = {}    # Index blobs read by this archive, {blob name: content}
+
+    def _read_json(self, blob_name, default):
+        '''Read a JSON index blob, cached'''
+        if blob_name not in self._cache:
+            data, _ = self._storage.read_versioned(self._container_name, blob_name)
+            self._cache[blob_name] = json.loads(data.decode()) if data != None else default
+        return self._cache[blob_name]
+
+    def _update_json(self, blob_name, default, update, attempts=5):
+        '''Read-modify-write a JSON index blob with a conditional write
+        Args:
+            blob_name (str) : name of index blob
+            default : content if the blob does not exist
+            update (callable) : (content) -> True if content was changed in place
+        Returns:
+            content : updated content
+        '''
+        for _ in range(attempts):
+            data, etag = self._storage.read_versioned(self._container_name, blob_name)
+            content = json.loads(data.decode()) if data != None else default
+            if not update(content):
+                self._cache[blob_name] = content
+                return content
+            if self._storage.write_versioned(self._container_name, blob_name, json.dumps(content, separators=(',', ':')), etag) != None:
+                self._cache[blob_name] = content
+                return content
+        raise RuntimeError(f'Archive index update failed after {attempts} attempts: {blob_name}')
+
+    def _partitions_blob(self, location):
+        return f'{self._prefix}/{location}/partitions.json'
+
+    def _index_blob(self, location, month):
+        return f'{self._prefix}/{location}/{month}/index.json'
+
+    def append(self, location, forecast):
+        '''Archive a forecast snapshot, keyed by its updateTime
+        Args:
+            location (str) : location name
+            forecast (dict) : decoded forecast, see GridData.get_data
+        Returns:
+            blob_name (str) : snapshot blob, None if this issue was already archived
+        '''
+        properties = forecast['data']['properties']
+        issued = to_epoch(properties['updateTime'])
+        issued_time = datetime.fromtimestamp(issued, timezone.utc)
+        month = issued_time.strftime('%Y-%m')
+        blob_name = f'{self._prefix}/{location}/{month}/{issued_time.strftime("%Y%m%dT%H%M%SZ")}.json.gz'
+
+        snapshot = {'format_version': ARCHIVE_FORMAT_VERSION,
+                    'location': location,
+                    'issued': issued,
+                    'lat_long': forecast.get('lat_long'),
+                    'elev': forecast.get('elev'),
+                    'grid_cell': forecast.get('grid_cell'),
+                    'properties': snapshot_columns(properties)}
+        data = gzip.compress(json.dumps(snapshot, separators=(',', ':')).encode(), compresslevel = 9, mtime = 0)
+
+        # Snapshots are create-only, an existing snapshot of the same issue is kept
+        created = self._storage.write_versioned(self._container_name, blob_name, data, None) != None
+
+        def add_issue(index):
+            issues = index['issues']
+            position = bisect.bisect_left(issues, issued, key=lambda issue: issue[0])
+            if position < len(issues) and issues[position][0] == issued:
+                return False
+            issues.insert(position, [issued, blob_name])
+            return True
+
+        def add_partition(partitions):
+            months = partitions['months']
+            position = bisect.bisect_left(months, month)
+            if position < len(months) and months[position] == month:
+                return False
+            months.insert(position, month)
+            return True
+
+        # Index after the snapshot exists, so queries never see an issue without its snapshot
+        self._update_json(self._index_blob(location, month), {'issues': []}, add_issue)
+        self._update_json(self._partitions_blob(location), {'months': []}, add_partition)
+        return blob_name if created else None
+
+    def get_issues(self, location, start=None, end=None):
+        '''Return archived issue times of a location
+        Args:
+            location (str) : location name
+            start (datetime) : Optional, earliest issue time
+            end (datetime) : Optional, latest issue time
+        Returns:
+            issues (list) : issue times, seconds since epoch, ascending
+        '''
+        start = to_epoch(start) if start != None else None
+        end = to_epoch(end) if end != None else None
+        months = self._read_json(self._partitions_blob(location), {'months': []})['months']
+
+        # Only partitions of months in the range are read
+        lower = 0 if start == None else bisect.bisect_left(months, datetime.fromtimestamp(start, timezone.utc).strftime('%Y-%m'))
+        upper = len(months) if end == None else bisect.bisect_right(months, datetime.fromtimestamp(end, timezone.utc).strftime('%Y-%m'))
+
+        issues = []
+        for month in months[lower:upper]:
+            for issued, _ in self._read_json(self._index_blob(location, month), {'issues': []})['issues']:
+                if (start == None or issued >= start) and (end == None or issued <= end):
+                    issues.append(issued)
+        return issues
+
+    def as_of(self, location, time):
+        '''Return the latest snapshot issued at or before a time
+        Args:
+            location (str) : location name
+            time (datetime) : point in time
+        Returns:
+            snapshot (dict) : {'issued': epoch, 'properties': {property: columns}, ...}, None if nothing was archived by then
+        '''
+        time = to_epoch(time)
+        months = self._read_json(self._partitions_blob(location), {'months': []})['months']
+        month = datetime.fromtimestamp(time, timezone.utc).strftime('%Y-%m')
+
+        # Latest partition at or before the month, earlier partitions only if it has no earlier issue
+        position = bisect.bisect_right(months, month)
+        while position > 0:
+            position -= 1
+            issues = self._read_json(self._index_blob(location, months[position]), {'issues': []})['issues']
+            found = bisect.bisect_right(issues, time, key=lambda issue: issue[0])
+            if found > 0:
+                return self.read_snapshot(issues[found - 1][1])
+        return None
+
+    def read_snapshot(self, blob_name):
+        '''Read and decode a snapshot blob'''
+        data = self._storage.read(self._container_name, blob_name)
+        return json.loads(gzip.decompress(data).decode())
+
+    def get_values(self, location, property, start, end, as_of):
+        '''Return what the forecast said about a time range, as of a point in time
+        e.g., snowfall for Saturday at Stevens Pass as of Tuesday morning
+        Args:
+            location (str) : location name
+            property (str) : forecast property, e.g., 'snowfallAmount'
+            start (datetime) : range start
+            end (datetime) : range end
+            as_of (datetime) : point in time
+        Returns:
+            values (dict) : {'issued': epoch, 'uom': uom, 'values': [(start epoch, seconds, value)]} of
+                            intervals overlapping the range, None if nothing was archived by then
+        '''
+        snapshot = self.as_of(location, as_of)
+        if snapshot == None:
+            return None
+        columns = snapshot['properties'].get(property)
+        if columns == None:
+            logging.info(f'\n\nProperty not archived, {location}: {property}\n\n')
+            return {'issued': snapshot['issued'], 'uom': None, 'values': []}
+
+        start = to_epoch(start)
+        end = to_epoch(end)
+        # Intervals start in order; the interval before the first start inside the range may overlap it
+        lower = max(bisect.bisect_right(columns['start'], start) - 1, 0)
+        upper = bisect.bisect_left(columns['start'], end)
+        values = [(columns['start'][i], columns['seconds'][i], columns['value'][i])
+                  for i in range(lower, upper)
+                  if columns['start'][i] + columns['seconds'][i] > start]
+        return {'issued': snapshot['issued'], 'uom': columns['uom'], 'values': values}
+
+
+
+def archive_forecasts(blob_storage, payloads, container_name='skiforecast'):
+    '''Archive fetched forecasts, run in the background after fetching
+    Args:
+        blob_storage (StorageSession) : storage backend
+        payloads (dict) : {location: decoded forecast}, see get_forecasts
+        container_name (str) : name of container
+    Returns:
+        archived (list) : locations with a new snapshot
+    '''
+    archive = Archive(blob_storage, container_name)
+    archived = []
+    for location, forecast in payloads.items():
+        try:
+            if archive.append(location, forecast) != None:
+                archived.append(location)
+        except Exception as e:
+            logging.info(f'\n\nError archiving forecast, {location}: {e}\n\n')
+    logging.info(f'\n\nARCHIVED FORECASTS: {archived}\n\n')
+    return archived
@@ -0,0 +1,164 @@
+import re
+import json
+import logging
+import conversions as conversions
+
+# Registered reducers, {name: Reducer}
+REDUCERS = {}
+
+# Reducers named with a parameter, e.g., 'p90' or 'hours_above_35'
+_PARAMETERIZED = []
+
+# Compiled plans, {PROPERTIES json: CalculationPlan}
+_plans = {}
+
+
+
+class Reducer:
+    '''Registered reducer'''
+
+    def __init__(self, name, fn, extremes, values, convert):
+        self.name = name
+        self.fn = fn
+        self.extremes = extremes
+        self.values = values
+        self.convert = convert
+
+
+
+class CalculationPlan:
+    '''Execution plan compiled from the PROPERTIES configuration
+    Calculation names are resolved to reducers once per run; aggregation then calls the
+    reducers of each property directly, with no per-value or per-period name dispatch.
+    '''
+
+    def __init__(self, properties):
+        '''Initialize CalculationPlan object
+        Args:
+            properties (dict) : {property: {'units': units, 'calculations': [calculation1, calculation2, ...]}}
+        Returns:
+            None
+        '''
+        self._steps = {}
+        self._extremes = {}
+        self._values = {}
+        for property, config in properties.items():
+            steps = []
+            for calculation in config.get('calculations', []):
+                found = resolve(calculation, property, config)
+                if found == None:
+                    continue
+                steps.append(found)
+            self._steps[property] = steps
+            self._extremes[property] = any(step.extremes for step in steps)
+            self._values[property] = any(step.values for step in steps)
+
+    def get_steps(self, property):
+        '''Return reducers of a property in configured order'''
+        return self._steps.get(property, [])
+
+    def needs_extremes(self, property):
+        '''Return True if a reducer of a property uses the maximum or minimum'''
+        return self._extremes.get(property, False)
+
+    def needs_values(self, property):
+        '''Return True if a reducer of a property uses the hourly values'''
+        return self._values.get(property, False)
+
+
+
+def reducer(name, extremes=False, values=False, convert='value'):
+    '''Register a reducer of the hourly values of a time period
+    Reducers are called as fn(count, total, high, low, samples, units) with the number of hours
+    with values, their sum, the first (time, value) maximum and minimum, the values themselves
+    and their units, before conversion to configured units.
+    Args:
+        name (str) : calculation name used in PROPERTIES
+        extremes (bool) : reducer uses high and low
+        values (bool) : reducer uses samples, otherwise samples is None
+        convert (str) : how results are converted to configured units,
+                        'value', 'extreme' for (time, value) or None for unit free results
+    Returns:
+        decorator (callable)
+    '''
+    def decorator(fn):
+        REDUCERS[name] = Reducer(name, fn, extremes, values, convert)
+        return fn
+    return decorator
+
+def parameterized(pattern, extremes=False, values=False, convert='value'):
+    '''Register a reducer factory for calculation names matching a pattern
+    The factory is called with the match and the property configuration and returns the reducer.
+    '''
+    def decorator(factory):
+        _PARAMETERIZED.append((re.compile(pattern), factory, extremes, values, convert))
+        return factory
+    return decorator
+
+def resolve(calculation, property, config):
+    '''Resolve a calculation name to a reducer, None if not a reduction, e.g., weather 'extr_str' '''
+    if calculation in REDUCERS:
+        return REDUCERS[calculation]
+    for pattern, factory, extremes, values, convert in _PARAMETERIZED:
+        match = pattern.match(calculation)
+        if match != None:
+            return Reducer(calculation, factory(match, property, config), extremes, values, convert)
+    if property != 'weather':
+        logging.info(f'\n\nUnknown calculation, {property}: {calculation}\n\n')
+    return None
+
+def get_plan(properties):
+    '''Return the compiled plan of a PROPERTIES configuration, compiled once per configuration'''
+    key = json.dumps(properties, sort_keys=True)
+    if key not in _plans:
+        _plans[key] = CalculationPlan(properties)
+    return _plans[key]
+
+@reducer('max', extremes=True, convert='extreme')
+def reduce_max(count, total, high, low, samples, units):
+    return high
+
+@reducer('min', extremes=True, convert='extreme')
+def reduce_min(count, total, high, low, samples, units):
+    return low
+
+@reducer('avg')
+@reducer('mean')
+def reduce_mean(count, total, high, low, samples, units):
+    # Time-weighted mean, values are hourly so every hour of a validTime interval counts once
+    return total / count
+
+@reducer('sum')
+def reduce_sum(count, total, high, low, samples, units):
+    return total
+
+@reducer('hours', convert=None)
+def reduce_hours(count, total, high, low, samples, units):
+    return count
+
+@parameterized(r'^p(\d{1,2})$', values=True)
+def percentile(match, property, config):
+    '''Percentile of hourly values, linearly interpolated, e.g., 'p90' '''
+    fraction = int(match.group(1)) / 100
+    def reduce_percentile(count, total, high, low, samples, units):
+        ordered = sorted(samples)
+        position = fraction * (len(ordered) - 1)
+        lower = int(position)
+        upper = min(lower + 1, len(ordered) - 1)
+        return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+    return reduce_percentile
+
+@parameterized(r'^hours_(above|below)_(-?\d+(?:\.\d+)?)$', values=True, convert=None)
+def exceedance(match, property, config):
+    '''Hours above or below a threshold in configured units, e.g., 'hours_above_35' '''
+    above = match.group(1) == 'above'
+    threshold = float(match.group(2))
+    thresholds = {config['units']: threshold}     # Threshold in units of the values
+    def reduce_exceedance(count, total, high, low, samples, units):
+        if units not in thresholds:
+            thresholds[units] = conversions.convert(threshold, property, config['units'])[1]
+        limit = thresholds[units]
+        if above:
+            return sum(1 for value in samples if value > limit)
+        return sum(1 for value in samples if value < limit)
+    return reduce_exceedance
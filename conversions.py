@@ -0,0 +1,109 @@
+import math
+import bisect
+from array import array
+
+def _above(edge):
+    '''Return the bin edge of values strictly above edge, bins include their lower edge'''
+    return math.nextafter(edge, math.inf)
+
+# Linear conversions, {(property, units): (new units, shift, multiplier, divisor, offset)},
+# value is ((value + shift) * multiplier / divisor) + offset, in the order of the original arithmetic
+LINEAR = {
+    ('temperature', 'degC'): ('degF', 0, 9, 5, 32),
+    ('temperature', 'degF'): ('degC', -32, 5, 9, 0),
+    ('windSpeed', 'km_h-1'): ('mph', 0, 0.621371, 1, 0),
+    ('windSpeed', 'mph'): ('km_h-1', 0, 1.60934, 1, 0),
+    ('windGust', 'km_h-1'): ('mph', 0, 0.621371, 1, 0),
+    ('windGust', 'mph'): ('km_h-1', 0, 1.60934, 1, 0),
+    ('quantitativePrecipitation', 'mm'): ('in', 0, 0.0393701, 1, 0),
+    ('quantitativePrecipitation', 'in'): ('mm', 0, 25.4, 1, 0),
+    ('snowfallAmount', 'mm'): ('in', 0, 0.0393701, 1, 0),
+    ('snowfallAmount', 'in'): ('mm', 0, 25.4, 1, 0),
+    ('snowLevel', 'm'): ('ft', 0, 3.28084, 1, 0),
+    ('snowLevel', 'ft'): ('m', 0, 0.3048, 1, 0),
+}
+
+# Binned conversions, {(property, units): (new units, bin edges, labels)}, a value belongs to the
+# bin of bisect_right(edges, value), i.e., len(labels) == len(edges) + 1
+_CARDINALS = ['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE', 'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW']
+BINS = {
+    ('windDirection', 'degree_(angle)'): ('cardinal', [11.25 + 22.5 * i for i in range(16)], _CARDINALS + ['N']),
+    ('skyCover', 'percent'): ('condition', [6, 26, 51, 70, 88],
+                              ['Clear', 'Mostly Clear', 'Partly Cloudy', 'Mostly Cloudy', 'Considerable Cloudiness', 'Overcast']),
+    ('probabilityOfPrecipitation', 'percent'): ('probability', [_above(10), 30, _above(50), _above(70)],
+                                                ['unlikely', 'slight chance', 'chance', 'likely', 'very likely']),
+}
+
+# Label conversions, {(property, units): (new units, {label: value})}
+LABELS = {
+    ('windDirection', 'cardinal'): ('degree_(angle)', {'N': 0, 'NNE': 22.5, 'NE': 45, 'ENE': 67.5, 'E': 90, 'ESE': 112.5,
+                                                       'SE': 135, 'SSE': 157.5, 'S': 180, 'SSW': 202.5, 'SW': 225,
+                                                       'WSW': 247.5, 'W': 270, 'WNW': 292.5, 'NW': 315, 'NNW': 337.5}),
+    ('skyCover', 'condition'): ('percent', {'Overcast': 100, 'Considerable Cloudiness': 87, 'Mostly Cloudy': 69,
+                                            'Partly Cloudy': 49, 'Mostly Clear': 25, 'Clear': 5}),
+    ('probabilityOfPrecipitation', 'probability'): ('percent', {'unlikely': 10, 'slight chance': 29, 'chance': 50,
+                                                               'likely': 70, 'very likely': 99}),
+}
+
+def convert(value, property, units):
+    '''Convert units of a value
+    Args:
+        value (float or str) : value to convert
+        property (str) : property of the value
+        units (str) : units of the value
+    Returns:
+        converted (tuple) : (new units, converted value)
+    '''
+    units_new, values = convert_array([value], property, units)
+    return (units_new, values[0])
+
+def convert_array(values, property, units):
+    '''Convert units of many values of a property in one call
+    Args:
+        values (iterable) : values to convert, NaN for missing values
+        property (str) : property of the values
+        units (str) : units of the values
+    Returns:
+        converted (tuple) : (new units, values), array('d') of numeric values, NaN kept,
+                            or a list of labels, None for NaN
+    '''
+    key = (property, units)
+    if key in LINEAR:
+        units_new, shift, multiplier, divisor, offset = LINEAR[key]
+        return (units_new, array('d', [((value + shift) * multiplier / divisor) + offset for value in values]))
+    if key in BINS:
+        units_new, edges, labels = BINS[key]
+        return (units_new, [labels[bisect.bisect_right(edges, value)] if value == value else None for value in values])
+    if key in LABELS:
+        units_new, table = LABELS[key]
+        return (units_new, array('d', [table.get(value, math.nan) for value in values]))
+    raise ValueError(f'No conversion of {property} from {units}')
+
+def convert_results(results, steps, property, units):
+    '''Convert calculated values of all time periods of a property in one call
+    Args:
+        results (dict) : {(day, time period): {calculation: value}}, see aggregation.combine_buckets
+        steps (list) : reducers of the property, see CalculationPlan.get_steps
+        property (str) : property of the values
+        units (str) : units of the values
+    Returns:
+        converted (tuple) : (new units, {(day, time period): {calculation: value}}), values of reducers
+                            without units are kept, extremes keep their time
+    '''
+    converting = [step for step in steps if step.convert != None]
+    values = [result[step.name][1] if step.convert == 'extreme' else result[step.name]
+              for result in results.values() if result['count'] > 0 for step in converting]
+    units_new, values = convert_array(values, property, units)
+    converted = {}
+    position = 0
+    for key, result in results.items():
+        result = dict(result)
+        if result['count'] > 0:
+            for step in converting:
+                if step.convert == 'extreme':
+                    result[step.name] = (result[step.name][0], values[position])
+                else:
+                    result[step.name] = values[position]
+                position += 1
+        converted[key] = result
+    return (units_new, converted)
@@ -0,0 +1,384 @@
+import os
+import time
+import random
+import threading
+import logging
+import requests
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+
+def get_fetch_workers():
+    '''Return number of concurrent NOAA API requests, from FETCH_WORKERS (default 4)'''
+    try:
+        workers = int(os.getenv("FETCH_WORKERS", "4"))
+    except ValueError:
+        logging.info(f'\n\nInvalid FETCH_WORKERS: {os.getenv("FETCH_WORKERS")}, using 1\n\n')
+        workers = 1
+    return max(workers, 1)
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    '''Return token bucket shared by every NOAA API request in this process
+    Rate and burst are read from NOAA_RATE_LIMIT (requests per second, default 1)
+    and NOAA_RATE_BURST (default 1) the first time the limiter is requested.
+    Returns:
+        limiter (TokenBucket) : shared rate limiter
+    '''
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            rate = float(os.getenv("NOAA_RATE_LIMIT", "1"))
+            burst = float(os.getenv("NOAA_RATE_BURST", "1"))
+            _rate_limiter = TokenBucket(rate, burst)
+    return _rate_limiter
+
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session(header):
+    '''Return pooled NOAA API session, reused across warm invocations
+    Args:
+        header (dict) : header for requests
+    Returns:
+        session (NOAASession) : shared session
+    '''
+    global _session
+    with _session_lock:
+        if _session is None or _session.get_header() != header:
+            _session = NOAASession(header, get_fetch_workers())
+    return _session
+
+def get_retry_policy():
+    '''Return retry policy for this run, configured from environment variables
+    RETRY_MAX_ATTEMPTS (default 3), RETRY_BASE_DELAY (default 0.5s), RETRY_MAX_DELAY (default 30s),
+    RETRY_BUDGET (default 60s of total retry waiting per run), BREAKER_THRESHOLD (default 5)
+    and BREAKER_COOLDOWN (default 300s).
+    Returns:
+        policy (RetryPolicy) : retry policy
+    '''
+    return RetryPolicy(max_attempts = int(os.getenv("RETRY_MAX_ATTEMPTS", "3")),
+                       base_delay = float(os.getenv("RETRY_BASE_DELAY", "0.5")),
+                       max_delay = float(os.getenv("RETRY_MAX_DELAY", "30")),
+                       budget = float(os.getenv("RETRY_BUDGET", "60")),
+                       breaker_threshold = int(os.getenv("BREAKER_THRESHOLD", "5")),
+                       breaker_cooldown = float(os.getenv("BREAKER_COOLDOWN", "300")))
+
+def parse_retry_after(value):
+    '''Parse Retry-After header
+    Args:
+        value (str) : delay in seconds or HTTP date
+    Returns:
+        delay (float) : seconds to wait, None if missing or invalid
+    '''
+    if value == None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+def breaker_key(url):
+    '''Return circuit breaker key for a NOAA API url, i.e., host and forecast office
+    e.g., https://api.weather.gov/gridpoints/SEW/150,50 -> api.weather.gov/gridpoints/SEW
+    '''
+    parsed = urlparse(url)
+    return parsed.netloc + '/'.join(parsed.path.split('/')[:3])
+
+
+
+class TokenBucket:
+    '''Thread-safe token bucket rate limiter'''
+
+    def __init__(self, rate, capacity=1):
+        '''Initialize TokenBucket object
+        Args:
+            rate (float) : tokens added per second, rate <= 0 disables limiting
+            capacity (float) : maximum tokens held, i.e., burst size
+        Returns:
+            None
+        '''
+        self._rate = float(rate)
+        self._capacity = max(float(capacity), 1.0)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._waited = 0.0
+
+    def acquire(self, tokens=1):
+        '''Block until tokens are available, then consume them
+        Args:
+            tokens (float) : tokens to consume
+        Returns:
+            waited (float) : seconds spent waiting
+        '''
+        if self._rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    self._waited += waited
+                    return waited
+                delay = (tokens - self._tokens) / self._rate
+            time.sleep(delay)
+            waited += delay
+
+    def get_waited(self):
+        '''Return total seconds callers have spent waiting on this bucket'''
+        with self._lock:
+            return self._waited
+
+
+
+class NOAASession:
+    '''Pooled keep-alive HTTP session for NOAA API requests
+    Remembers ETag / Last-Modified validators per url so repeat requests can be
+    sent as conditional GETs; a 304 response means the previous payload is still current.
+    '''
+
+    def __init__(self, header, pool_size=4):
+        '''Initialize NOAASession object
+        Args:
+            header (dict) : header for requests
+            pool_size (int) : number of pooled connections per host
+        Returns:
+            None
+        '''
+        self._header = dict(header)
+        self._session = requests.Session()
+        self._session.headers.update(self._header)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+        self._validators = {}
+        self._lock = threading.Lock()
+
+    def get(self, url, conditional=False, **kwargs):
+        '''Send GET request over pooled connection
+        Args:
+            url (str) : request url
+            conditional (bool) : send If-None-Match / If-Modified-Since from stored validators
+        Returns:
+            response (Response) : requests response, status 304 if not modified
+        '''
+        headers = {}
+        if conditional:
+            with self._lock:
+                validator = self._validators.get(url)
+            if validator != None:
+                if validator.get('etag') != None:
+                    headers['If-None-Match'] = validator['etag']
+                if validator.get('last_modified') != None:
+                    headers['If-Modified-Since'] = validator['last_modified']
+
+        response = self._session.get(url, headers = headers, **kwargs)
+
+        if conditional and response.status_code == 200:
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            with self._lock:
+                if etag != None or last_modified != None:
+                    self._validators[url] = {'etag': etag, 'last_modified': last_modified}
+                elif url in self._validators:
+                    del self._validators[url]
+
+        return response
+
+    def get_header(self):
+        '''Return session header'''
+        return self._header
+
+    def get_validators(self, urls=None):
+        '''Return stored validators
+        Args:
+            urls (iterable) : restrict to these urls, all if None
+        Returns:
+            validators (dict) : {url: {'etag': etag, 'last_modified': last_modified}}
+        '''
+        with self._lock:
+            if urls == None:
+                return dict(self._validators)
+            return {url: self._validators[url] for url in urls if url in self._validators}
+
+    def set_validators(self, validators):
+        '''Load validators, e.g., persisted from a previous run
+        Args:
+            validators (dict) : {url: {'etag': etag, 'last_modified': last_modified}}
+        Returns:
+            None
+        '''
+        with self._lock:
+            for url, validator in validators.items():
+                if url not in self._validators:
+                    self._validators[url] = validator
+
+
+
+class RetryPolicy:
+    '''Retry policy and circuit breakers for NOAA API requests
+    Classifies failures, backs off exponentially with full jitter, honours Retry-After,
+    stops requesting an endpoint while its circuit breaker is open and caps the
+    total time spent waiting on retries during a run.
+    '''
+
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=30, budget=60, breaker_threshold=5, breaker_cooldown=300, sleep=time.sleep):
+        '''Initialize RetryPolicy object
+        Args:
+            max_attempts (int) : attempts per request, including the first
+            base_delay (float) : backoff delay for the first retry, seconds
+            max_delay (float) : maximum delay between attempts, seconds
+            budget (float) : total seconds of retry waiting allowed per run
+            breaker_threshold (int) : consecutive failures that open a breaker
+            breaker_cooldown (float) : seconds a breaker stays open before a trial request
+            sleep (callable) : sleep function
+        Returns:
+            None
+        '''
+        self._max_attempts = max(max_attempts, 1)
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._budget = budget
+        self._breaker_threshold = max(breaker_threshold, 1)
+        self._breaker_cooldown = breaker_cooldown
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._breakers = {}     # {key: [consecutive failures, opened at]}
+        self._stats = {'attempts': 0, 'retries': 0, 'refreshes': 0, 'retry_time': 0.0, 'breaker_open': 0, 'budget_exhausted': 0}
+
+    def classify(self, status):
+        '''Classify a failed request
+        Args:
+            status (int) : HTTP status, None if no response
+        Returns:
+            action (str) : 'refresh' endpoint may be stale, re-resolve and retry
+                           'throttle' rate limited, retry after Retry-After
+                           'transient' server error, retry with backoff
+                           'fatal' do not retry
+        '''
+        if status == None:
+            return 'refresh'
+        elif status == 429:
+            return 'throttle'
+        elif status in (400, 401, 403):
+            return 'fatal'
+        elif 300 <= status < 500:
+            return 'refresh'
+        elif 500 <= status < 600:
+            return 'transient'
+        return 'fatal'
+
+    def get_delay(self, attempt, retry_after=None):
+        '''Return delay before the next attempt
+        Args:
+            attempt (int) : number of failed attempts so far
+            retry_after (float) : server requested delay, seconds
+        Returns:
+            delay (float) : seconds
+        '''
+        if retry_after != None:
+            return min(retry_after, self._max_delay)
+        return random.random() * min(self._max_delay, self._base_delay * 2 ** (attempt - 1))
+
+    def allow(self, key):
+        '''Return True if the breaker for key is closed, or open long enough for a trial request'''
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker == None or breaker[1] == None:
+                return True
+            if time.monotonic() - breaker[1] >= self._breaker_cooldown:
+                breaker[1] = time.monotonic()   # Half-open, allow one trial request
+                return True
+            return False
+
+    def record(self, key, success):
+        '''Record request outcome for the breaker for key'''
+        with self._lock:
+            self._stats['attempts'] += 1
+            breaker = self._breakers.setdefault(key, [0, None])
+            if success:
+                breaker[0] = 0
+                breaker[1] = None
+                return
+            breaker[0] += 1
+            if breaker[0] >= self._breaker_threshold:
+                if breaker[1] == None:
+                    self._stats['breaker_open'] += 1
+                    logging.info(f'\n\nCIRCUIT BREAKER OPEN: {key}\n\n')
+                breaker[1] = time.monotonic()
+
+    def wait(self, delay):
+        '''Wait before a retry if the run's retry budget allows it
+        Args:
+            delay (float) : seconds
+        Returns:
+            allowed (bool) : False if the budget is exhausted
+        '''
+        with self._lock:
+            if self._stats['retry_time'] + delay > self._budget:
+                self._stats['budget_exhausted'] += 1
+                return False
+            self._stats['retry_time'] += delay
+            self._stats['retries'] += 1
+        self._sleep(delay)
+        return True
+
+    def call(self, key, request, refresh=None):
+        '''Run a request, retrying failures according to the policy
+        Args:
+            key (str) : circuit breaker key, see breaker_key
+            request (callable) : () -> (result, status, error, retry_after)
+            refresh (callable) : called before retrying a 'refresh' failure, e.g., to re-resolve the endpoint
+        Returns:
+            result : result of the last attempt, None if the breaker was open before the first attempt
+        '''
+        result = None
+        attempt = 0
+        while True:
+            if not self.allow(key):
+                logging.info(f'\n\nCIRCUIT OPEN, SKIPPING: {key}\n\n')
+                return result
+
+            result, status, error, retry_after = request()
+            action = None if error == False else self.classify(status)
+
+            # Only server side failures count toward the breaker
+            if action == None:
+                self.record(key, True)
+                return result
+            elif action in ('throttle', 'transient'):
+                self.record(key, False)
+            else:
+                with self._lock:
+                    self._stats['attempts'] += 1
+
+            attempt += 1
+            logging.info(f'\n\nREQUEST FAILED -- KEY: {key}, STATUS: {status}, ACTION: {action}, ATTEMPT: {attempt}\n\n')
+            if action == 'fatal' or attempt >= self._max_attempts:
+                return result
+            if action == 'refresh' and refresh != None:
+                with self._lock:
+                    self._stats['refreshes'] += 1
+                refresh()
+            if not self.wait(self.get_delay(attempt, retry_after)):
+                logging.info(f'\n\nRETRY BUDGET EXHAUSTED: {key}\n\n')
+                return result
+
+    def get_stats(self):
+        '''Return retry statistics for this run'''
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,120 @@
+import math
+from array import array
+import time_utils as time_utils
+
+HOUR = 3600
+
+# Properties whose values are amounts over their validTime interval, split across hours
+ACCUMULATIONS = ('quantitativePrecipitation', 'snowfallAmount')
+
+# Marks hours without a value in hourly arrays
+MISSING = math.nan
+
+def get_hourly_grid(day_index):
+    '''Return the hourly time axis covering the forecast days of a run
+    Args:
+        day_index (DayIndex) : forecast day boundaries, see time_utils.DayIndex
+    Returns:
+        grid (HourlyGrid) : hourly grid from the start of day0 to the end of the last day
+    '''
+    boundaries = day_index.get_boundaries()
+    return HourlyGrid(boundaries[0], (boundaries[-1] - boundaries[0]) // HOUR)
+
+
+def parse_intervals(values):
+    '''Parse gridData values into (start epoch, seconds, value) tuples
+    Args:
+        values (list) : [{'validTime': ..., 'value': ...}]
+    Returns:
+        intervals (list) : [(start epoch, seconds, value)]
+    '''
+    return [time_utils.parse_valid_time(value['validTime']) + (value['value'],) for value in values]
+
+
+
+class HourlyGrid:
+    '''Hourly time axis shared by all properties and locations of a run
+    Forecast values are intervals of one or more hours. Expanding them onto the grid gives
+    every hour the same weight, so averages are time-weighted and periods split on hour
+    boundaries, e.g., a 6 hour value crossing noon counts in both the am and pm periods.
+    '''
+
+    def __init__(self, start, hours):
+        '''Initialize HourlyGrid object
+        Args:
+            start (int) : first hour, seconds since epoch
+            hours (int) : number of hours
+        Returns:
+            None
+        '''
+        self._start = start
+        self._hours = hours
+        self._end = start + hours * HOUR
+
+    def get_start(self):
+        '''Return first hour, seconds since epoch'''
+        return self._start
+
+    def get_hours(self):
+        '''Return number of hours'''
+        return self._hours
+
+    def get_times(self):
+        '''Return start of each hour, seconds since epoch'''
+        return [self._start + hour * HOUR for hour in range(self._hours)]
+
+    def time(self, hour):
+        '''Return start of an hour, seconds since epoch'''
+        return self._start + hour * HOUR
+
+    def hour(self, epoch):
+        '''Return hour of a time, may be outside the grid'''
+        return (epoch - self._start) // HOUR
+
+    def span(self, start, end):
+        '''Return range of hours overlapping [start, end), clipped to the grid'''
+        first = max((start - self._start) // HOUR, 0)
+        last = min(-((self._start - end) // HOUR), self._hours)
+        return range(first, last)
+
+    def expand(self, intervals, accumulate=False):
+        '''Expand interval values onto the grid
+        Args:
+            intervals (iterable) : (start epoch, seconds, value) tuples, value may be None
+            accumulate (bool) : values are amounts over the interval, split in proportion to
+                                the overlap of each hour; otherwise each hour takes the value
+        Returns:
+            values (array) : array('d') of hourly values, MISSING where no interval covers the hour
+        '''
+        values = array('d', [MISSING]) * self._hours
+        for start, seconds, value in intervals:
+            if value == None or seconds <= 0:
+                continue
+            end = start + seconds
+            if end <= self._start or start >= self._end:
+                continue
+            hours = self.span(start, end)
+            if not accumulate:
+                values[hours.start:hours.stop] = array('d', [value]) * len(hours)
+                continue
+            for hour in hours:
+                hour_start = self._start + hour * HOUR
+                overlap = min(end, hour_start + HOUR) - max(start, hour_start)
+                amount = value * overlap / seconds
+                values[hour] = amount if math.isnan(values[hour]) else values[hour] + amount
+        return values
+
+    def expand_codes(self, intervals):
+        '''Expand interval codes onto the grid, e.g., interned weather
+        Args:
+            intervals (iterable) : (start epoch, seconds, code) tuples, codes > 0
+        Returns:
+            codes (array) : array('i') of hourly codes, 0 where no interval covers the hour
+        '''
+        codes = array('i', [0]) * self._hours
+        for start, seconds, code in intervals:
+            if seconds <= 0 or start + seconds <= self._start or start >= self._end:
+                continue
+            hours = self.span(start, start + seconds)
+            codes[hours.start:hours.stop] = array('i', [code]) * len(hours)
+        return codes
@@ -0,0 +1,95 @@
+import threading
+from dataclasses import dataclass
+
+# Weather of an hour without conditions, (weather, intensity, coverage) of each condition
+NO_WEATHER = ((None, None, None),)
+
+# Interned weather of the current run, code 0 marks hours without weather values
+_weather_lock = threading.Lock()
+_weather_codes = {}
+_weather = [None]
+
+def intern_weather(conditions):
+    '''Return code of the weather conditions of an hour
+    The same conditions repeat across hours and locations, so each distinct set is stored once.
+    Args:
+        conditions (iterable) : [(weather, intensity, coverage)]
+    Returns:
+        code (int) : weather code, > 0
+    '''
+    conditions = tuple(tuple(condition) for condition in conditions)
+    code = _weather_codes.get(conditions)
+    if code == None:
+        with _weather_lock:
+            code = _weather_codes.get(conditions)
+            if code == None:
+                code = len(_weather)
+                _weather.append(conditions)
+                _weather_codes[conditions] = code
+    return code
+
+def get_weather(code):
+    '''Return weather conditions of a code, None for code 0'''
+    return _weather[code]
+
+def reset_weather():
+    '''Forget interned weather at the start of a run, warm invocations would grow it otherwise
+    Codes of earlier runs are no longer valid, forecasts are parsed again every run.
+    '''
+    global _weather_codes, _weather
+    with _weather_lock:
+        _weather_codes = {}
+        _weather = [None]
+
+
+
+@dataclass(slots=True)
+class Prediction:
+    '''Hourly values of a forecast property'''
+    units: str
+    values: object      # array('d') with NaN for missing hours, array('i') of weather codes for weather
+
+
+@dataclass(slots=True)
+class Forecast:
+    '''Parsed forecast of a location, see TableData.parse_forecast'''
+    lat_long: list
+    elev: list
+    href: list
+    start: int          # first hour of the hourly grid, seconds since epoch
+    hours: int          # number of hours
+    predictions: dict   # {property: Prediction}
+
+
+@dataclass(slots=True)
+class PropertyResult:
+    '''Calculated values of a property for a time period'''
+    units: str
+    data: object        # {calculation: value}, [(time, conditions)] for weather, None without values;
+                        # times are seconds since epoch, e.g., {'max': (time, value)}
+
+
+@dataclass(slots=True)
+class PeriodResult:
+    '''Calculated values and statuses of a time period'''
+    data: dict          # {property: PropertyResult}
+    status: dict        # {property: status}
+    overall: int = None # lowest status of the time period
+
+
+@dataclass(slots=True)
+class DayResult:
+    '''Calculated values of a forecast day'''
+    date: object        # local date of the forecast day
+    start: int          # start of the forecast day, seconds since epoch
+    periods: dict       # {time period: PeriodResult}
+
+
+@dataclass(slots=True)
+class LocationResult:
+    '''Table data of a location, see TableData.calculate_table_data'''
+    location: str
+    lat_long: list
+    elev: list
+    href: list
+    days: dict          # {day: DayResult}
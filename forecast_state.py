@@ -0,0 +1,164 @@
+import json
+import hashlib
+import utils as utils
+import time_utils as time_utils
+import aggregation as aggregation
+import forecast_model as forecast_model
+
+# Blob keeping the state of the previous run
+STATE_BLOB = 'forecastState.json'
+
+# Version of the state format and of the calculations it caches, older states are discarded
+STATE_VERSION = 2
+
+def config_key(*config):
+    '''Return digest of the configuration calculated values depend on, e.g., PROPERTIES and location details'''
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+def digest_values(prediction, start, stop):
+    '''Return digest of the hourly values of a prediction from hour start to stop
+    Weather codes are interned per run, so weather is digested by its conditions.
+    '''
+    if prediction.units == 'text':
+        values = repr(tuple(forecast_model.get_weather(code) for code in prediction.values[start:stop])).encode()
+    else:
+        values = prediction.values[start:stop].tobytes()
+    return hashlib.blake2b(prediction.units.encode() + b'|' + values, digest_size=16).hexdigest()
+
+def load_result(property, result):
+    '''Return a period result read from JSON data, tuples restored'''
+    if property == 'weather':
+        return {'count': result['count'],
+                'data': [(time, tuple(tuple(condition) for condition in conditions)) for time, conditions in result['data']]}
+    return {name: tuple(value) if isinstance(value, list) else value for name, value in result.items()}
+
+
+
+class ForecastState:
+    '''Calculated values of the previous run, reused for forecast days that did not change
+    Forecast days are keyed by date, so a day computed as day1 is reused as day0 the next day.
+    A (property, day) slice is recomputed only if the hourly values of the property on that
+    date changed; row cells are reused for days where no property changed.
+    '''
+
+    def __init__(self, time, time_periods, state=None):
+        '''Initialize ForecastState object
+        Args:
+            time (datetime) : current time
+            time_periods (dict) : {day: [time_period1, time_period2, ...]}
+            state (dict) : Optional, state of the previous run, see dumps
+        Returns:
+            None
+        '''
+        self._day_index = time_utils.get_day_index(time)
+        groups = self._day_index.get_groups()
+        dates = self._day_index.get_dates()
+        period_index = aggregation.get_period_index(time, time_periods)
+        self._grid = period_index.get_grid()
+        self._days = [day for day in time_periods.keys() if day in groups]
+        self._numbers = {day: groups.index(day) for day in self._days}
+        self._dates = {day: dates[groups.index(day)].isoformat() for day in self._days}
+        # Cells name the day, e.g., 'Today', and are formatted by the day slot, e.g., AM|PM|ON temperatures of day0-day2
+        self._labels = {day: [time_utils.day_label(dates[groups.index(day)], time), utils.ROW_FORMATS.get(day)] for day in self._days}
+        self._periods = {day: [period for key_day, period in period_index.get_segments().keys() if key_day == day] for day in self._days}
+        self._previous = {}
+        if state != None and state.get('version') == STATE_VERSION:
+            self._previous = state['locations']
+        self._locations = {}
+        self._slices = {}
+        self._unchanged = {}
+
+    def compare(self, location, config, forecast, update_time=None):
+        '''Find the (property, day) slices of a location to recompute
+        Args:
+            location (str) : location name
+            config (str) : configuration key, see config_key
+            forecast (Forecast) : parsed forecast of this run
+            update_time (str) : Optional, updateTime of the forecast, digests of days saved for the
+                                same updateTime are reused without hashing the values again
+        Returns:
+            None
+        '''
+        previous = self._previous.get(location, {})
+        if previous.get('config') != config:
+            previous = {}
+        same_update = update_time != None and previous.get('update_time') == update_time
+        saved_digests = previous.get('digests', {})
+        saved_results = previous.get('results', {})
+
+        digests = {}
+        slices = {}
+        unchanged = set()
+        for day in self._days:
+            date = self._dates[day]
+            if same_update and date in saved_digests:
+                digests[date] = saved_digests[date]
+            else:
+                span = self._grid.span(*self._day_index.get_period(self._numbers[day], '24h'))
+                digests[date] = {property: digest_values(prediction, span.start, span.stop)
+                                 for property, prediction in forecast.predictions.items()}
+
+            saved = saved_results.get(date, {})
+            changed = False
+            for property in forecast.predictions.keys():
+                if digests[date][property] != saved_digests.get(date, {}).get(property) or \
+                   any(period not in saved.get(property, {}) for period in self._periods[day]):
+                    slices.setdefault(property, []).append(day)
+                    changed = True
+            if not changed and digests[date] == saved_digests.get(date):
+                unchanged.add(day)
+
+        self._slices[location] = slices
+        self._unchanged[location] = unchanged
+        self._locations[location] = {'config': config, 'update_time': update_time, 'digests': digests,
+                                     'results': {}, 'cells': {}}
+
+    def get_slices(self):
+        '''Return slices to recompute, {location: {property: [day]}}, see aggregation.aggregate_forecasts'''
+        return self._slices
+
+    def merge(self, aggregates):
+        '''Complete aggregates of this run with the saved results of unchanged slices
+        Args:
+            aggregates (dict) : {location: {property: {(day, time period): result}}} of the recomputed slices
+        Returns:
+            None, aggregates are completed in place and saved for the next run
+        '''
+        for location, state in self._locations.items():
+            saved_results = self._previous.get(location, {}).get('results', {})
+            location_aggregates = aggregates.setdefault(location, {})
+            for day in self._days:
+                date = self._dates[day]
+                results = {}
+                for property in state['digests'][date].keys():
+                    property_aggregates = location_aggregates.setdefault(property, {})
+                    if day not in self._slices[location].get(property, []):
+                        for period in self._periods[day]:
+                            property_aggregates[(day, period)] = load_result(property, saved_results[date][property][period])
+                    results[property] = {period: property_aggregates[(day, period)] for period in self._periods[day]
+                                         if (day, period) in property_aggregates}
+                state['results'][date] = results
+
+    def get_cells(self, location):
+        '''Return saved row cells of the unchanged days of a location, {day: cell}, see TableData.create_row'''
+        saved_cells = self._previous.get(location, {}).get('cells', {})
+        cells = {}
+        for day in self._unchanged.get(location, set()):
+            saved = saved_cells.get(self._dates[day])
+            # Reuse cells only under the same name and format
+            if saved != None and saved[0] == self._labels[day]:
+                cells[day] = saved[1]
+        return cells
+
+    def set_row(self, location, row):
+        '''Save row cells of a location for the next run, see TableData.create_row'''
+        if location not in self._locations or len(row) != len(self._days) + 1:
+            return
+        for day, cell in zip(self._days, row[1:]):
+            self._locations[location]['cells'][self._dates[day]] = [self._labels[day], cell]
+
+    def dumps(self):
+        '''Return state of this run as JSON, locations not processed in this run keep their previous state'''
+        locations = dict(self._previous)
+        locations.update(self._locations)
+        return json.dumps({'version': STATE_VERSION, 'locations': locations})
@@ -9,16 +9,16 @@ def cron(skiForecastTimer: func.TimerRequest) -> None:
     import os
     import json
     from datetime import datetime
+    from concurrent.futures import ThreadPoolExecutor
     import pytz
     import bs4 as BeautifulSoup
     from dotenv import load_dotenv
     import utils as utils
+    import storage as storage
+    import archive as archive
     import get_endpoints as get_endpoints
     import get_forecasts as get_forecasts
     import proc_forecasts as proc_forecasts
-
-    from azure.identity import DefaultAzureCredential
-    from azure.storage.blob import BlobServiceClient, ContainerClient, ContentSettings
     
     # Get current time
     now = datetime.now(pytz.UTC)
@@ -30,54 +30,77 @@ def cron(skiForecastTimer: func.TimerRequest) -> None:
 
     # Define parameters
     func_account_url = os.getenv("BLOB_ACCOUNT_URL")
-    default_credential = DefaultAzureCredential()
+    default_credential = storage.get_credential()
+    blob_storage = storage.get_storage(func_account_url, default_credential)
     endpoints_file = "noaa_api_endpoints.json"
     container_name = "skiforecast"
-    my_content_setting = ContentSettings(content_type = 'application/octet-stream')
 
-    # Enumerate container contents, check for endpoints file
+    # Check for endpoints file in the container manifest, a single read instead of listing the container
     try:
         endpoints = False
-        container = ContainerClient(account_url=func_account_url, container_name=container_name, credential=default_credential)
-        blob_list = container.list_blobs()
-        for blob in blob_list:    
-            if blob.name == endpoints_file:
-                endpoints = True
+        manifest = blob_storage.get_manifest(container_name, reload=True)
+        if manifest.get(endpoints_file) != None or blob_storage.exists(container_name, endpoints_file):
+            endpoints = True
     except Exception as e:
         logging.info(f'\n\nError checking container contents: {e}\n\n')
     logging.info(f'\n\nENDPOINTS STATUS: {endpoints}\n\n')
 
+    # Read endpoints cache, the manifest entry is only a hint, a cache that cannot be read is rebuilt
+    cached = None
+    if endpoints == True:
+        try:
+            blob = utils.readblob(endpoints_file, container_name, func_account_url, default_credential)
+            cached = json.loads(blob.decode())
+        except Exception as e:
+            logging.info(f'\n\nError reading endpoints, rebuilding cache: {e}\n\n')
+            blob_storage.get_manifest(container_name).discard(endpoints_file)
+            endpoints = False
+
     ## Get endpoints or create endpoints cache if not exists
+    stale = []
+    pending = []    # Blob writes running in the background, waited for at the end of the run
     try:
         if endpoints == True:
-            blob = utils.readblob(endpoints_file, container_name, func_account_url, default_credential)
-            endpoints = json.loads(blob.decode())
+            endpoints, stale, changed = get_endpoints.check_endpoints(cached, now)
+            if changed:
+                get_endpoints.save_endpoints(endpoints, default_credential)
         elif endpoints == False:
             ep = get_endpoints.get_endpoints()
-            blob_input = json.dumps(ep, sort_keys=False, indent=4)
-            utils.writeblob(endpoints_file, blob_input, container_name, func_account_url, default_credential)
-            blob = utils.readblob(endpoints_file, container_name, func_account_url, default_credential)
-            endpoints = json.loads(blob.decode())
+            endpoints = ep
+            pending.append(blob_storage.submit(get_endpoints.save_endpoints, endpoints, default_credential))
         #logging.info(f'\n\nENDPOINTS: {endpoints}\n\n')
 
     except Exception as e:
         logging.info(f'\n\nError fetching endpoints: {e}\n\n')
 
-    # Get forecasts, save to blob, list blob names
+    # Revalidate stale endpoints in the background, stale endpoints are used for this run
+    background = ThreadPoolExecutor(max_workers=1)
+    revalidation = None
+    if len(stale) > 0:
+        revalidation = background.submit(get_endpoints.revalidate_endpoints, endpoints, stale, default_credential)
+
+    # Get forecasts, save to blob in the background, list blob names
+    unchanged = set()
+    payloads = {}   # Fetched forecasts handed to processing in memory
     try:
-        forecasts = get_forecasts.get_forecasts(default_credential, endpoints)
+        forecasts = get_forecasts.get_forecasts(default_credential, endpoints, unchanged, payloads, pending)
     except Exception as e:
         logging.info(f'\n\nError fetching forecasts: {e}\n\n')
 
+    # Append new forecasts to the historical archive in the background
+    if os.getenv("ARCHIVE_FORECASTS", "true") == "true":
+        pending.append(blob_storage.submit(archive.archive_forecasts, blob_storage, payloads, container_name))
+
     # Process forecasts
     try:
-        table = proc_forecasts.proc_forecasts(default_credential, now, forecasts)
+        table = proc_forecasts.proc_forecasts(default_credential, now, forecasts, unchanged, payloads, pending)
     except Exception as e:
         logging.info(f'\n\nError processing forecasts: {e}\n\n')
 
-    # Write table to blob
+    # Write table to blob, upload runs while the html is built
+    table_write = None
     try:
-        utils.writeblob("tableData.json", json.dumps(table, sort_keys=False, indent=4), container_name, func_account_url, default_credential)
+        table_write = blob_storage.submit(utils.writeblob, "tableData.json", json.dumps(table, sort_keys=False, indent=4), container_name, func_account_url, default_credential, True)
     except Exception as e:
         logging.info(f'\n\nError writing table to blob: {e}\n\n')
 
@@ -125,6 +148,13 @@ def cron(skiForecastTimer: func.TimerRequest) -> None:
     });
     """
 
+    # JavaScript for the update time, read from a separate blob so the page changes only with the forecast
+    updated_js = """
+    fetch('updated.json', {cache: 'no-store'})
+          .then(function(response) { return response.json(); })
+          .then(function(data) { document.getElementById('updated').textContent = 'Updated: ' + data.updated; });
+    """
+
     # Create HTML output
     html = "<!DOCTYPE html>\n"
     html += "<html lang='en'>\n<head>\n"
@@ -174,7 +204,10 @@ def cron(skiForecastTimer: func.TimerRequest) -> None:
     html += '<script>'
     html += f'{js}'
     html += '</script>'
-    html += f"<h3>Updated: {local_time.strftime('%Y-%m-%d %H:%M')} (PDT)</h3>\n"
+    html += '<h3 id="updated"></h3>\n'
+    html += '<script>'
+    html += f'{updated_js}'
+    html += '</script>'
     html += '<section id="notes">\n<h3>NOTES</h3>\n'
     html += '<p>\nClick or hover over table cells for more data.\n</p>\n'
     html += '<p>\nKey:\n</p>\n'
@@ -197,13 +230,45 @@ def cron(skiForecastTimer: func.TimerRequest) -> None:
     pretty_html = soup.prettify()
     html_file = 'ski.html'
 
-    # Write html file to blob
-    blob_client = container.get_blob_client(html_file)
+    # Write html file to blob, skipped if the page is unchanged
     web_container = "$web"
-    my_content_setting = ContentSettings(content_type = 'text/html')
     try:
-        blob_service_client = BlobServiceClient(account_url=func_account_url, credential=default_credential)
-        blob_client = blob_service_client.get_blob_client(container=web_container, blob=html_file)
-        blob_client.upload_blob(pretty_html, overwrite=True, content_settings=my_content_setting)
+        if not blob_storage.write_if_changed(web_container, html_file, pretty_html, content_type = 'text/html'):
+            logging.info(f'\n\nHTML UNCHANGED, SKIPPED UPLOAD\n\n')
     except Exception as e:
         logging.info(f'\n\nError writing html to blob: {e}\n\n')
+
+    # Write update time of the page, the only part that changes every run
+    try:
+        updated = json.dumps({'updated': f"{local_time.strftime('%Y-%m-%d %H:%M')} (PDT)"})
+        blob_storage.write(web_container, 'updated.json', updated, content_type = 'application/json')
+    except Exception as e:
+        logging.info(f'\n\nError writing update time to blob: {e}\n\n')
+
+    # Wait for table upload
+    try:
+        if table_write != None:
+            table_write.result()
+    except Exception as e:
+        logging.info(f'\n\nError writing table to blob: {e}\n\n')
+
+    # Wait for background forecast and endpoints writes
+    for write in pending:
+        try:
+            write.result()
+        except Exception as e:
+            logging.info(f'\n\nError writing blob: {e}\n\n')
+
+    # Wait for background endpoint revalidation
+    try:
+        if revalidation != None:
+            revalidation.result()
+    except Exception as e:
+        logging.info(f'\n\nError revalidating endpoints: {e}\n\n')
+    background.shutdown()
+
+    # Record this run's blob writes in the container manifest
+    try:
+        blob_storage.get_manifest(container_name).commit()
+    except Exception as e:
+        logging.info(f'\n\nError updating manifest: {e}\n\n')
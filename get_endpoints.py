@@ -1,22 +1,34 @@
 import os
 import json
+import threading
+from datetime import datetime
+import pytz
 from dotenv import load_dotenv
 import utils as utils
+import fetch_utils as fetch_utils
 import logging
 
-def get_endpoints():
-    '''Get endpoints from NOAA API, cache endpoints in a blob'''
-    
+_save_lock = threading.Lock()
+
+def get_endpoints(names=None):
+    '''Get endpoints from NOAA API, cache endpoints in a blob
+    Args:
+        names (iterable): Optional, location names to resolve, all locations if None
+    Returns:
+        endpoints (dict): {location: {'forecastGridData': url, 'gridId': ..., 'resolved_at': ...}}'''
+
     # Load environment variables
     load_dotenv()
     locations = json.loads(os.getenv("LOCATIONS"))
     PURPOSE = os.getenv("PURPOSE")
     EMAIL = os.getenv("EMAIL")
-    
+    if names != None:
+        locations = {location: locations[location] for location in names if location in locations}
+
     # API url for location metadata, header for requests
-    metadata_url = 'https://api.weather.gov/points/'
+    metadata_url = f'{os.getenv("NOAA_API_URL", "https://api.weather.gov")}/points/'
     header = {'User-Agent' : (f'{PURPOSE}, {EMAIL}')}
-    
+
     # Forecast type:
     forecast_type = 'forecastGridData'
 
@@ -26,7 +38,10 @@ def get_endpoints():
 
     # Get endpoints
     try:
-        cache = utils.APIEndpoints(locations, metadata_url, header, forecast_type, container_name, blob_name)
+        limiter = fetch_utils.get_rate_limiter()
+        workers = fetch_utils.get_fetch_workers()
+        session = fetch_utils.get_session(header)
+        cache = utils.APIEndpoints(locations, metadata_url, header, forecast_type, container_name, blob_name, limiter, workers, session)
         endpoints = cache.get_endpoints()
 
         # Handle missed endpoints
@@ -34,9 +49,115 @@ def get_endpoints():
             for key in (locations.keys() - endpoints.keys()):
                 if key in locations.keys():
                     del locations[key]
-    
+
     except Exception as e:
         logging.info(f'\n\nError in get_endpoints: \n{e}\n\n')
         endpoints = None
 
-    return endpoints
\ No newline at end of file
+    return endpoints
+
+def endpoint_url(endpoint):
+    '''Return forecastGridData url of a cached endpoint, caches written before grid metadata store the url only'''
+    if isinstance(endpoint, dict):
+        return endpoint.get('forecastGridData')
+    return endpoint
+
+def grid_cell(endpoint):
+    '''Return NWS grid cell key of a cached endpoint, e.g., 'SEW/150,50', or its url if metadata is missing'''
+    if isinstance(endpoint, dict) and None not in (endpoint.get('gridId'), endpoint.get('gridX'), endpoint.get('gridY')):
+        return f"{endpoint['gridId']}/{endpoint['gridX']},{endpoint['gridY']}"
+    return endpoint_url(endpoint)
+
+def endpoint_age(endpoint, now):
+    '''Return seconds since endpoint was resolved, None if unknown'''
+    try:
+        resolved_at = pytz.UTC.localize(datetime.strptime(endpoint['resolved_at'], '%Y-%m-%dT%H:%M:%SZ'))
+        return (now - resolved_at).total_seconds()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def check_endpoints(endpoints, now=None):
+    '''Check cached endpoints against their TTL
+    Endpoints younger than ENDPOINT_TTL (default 7 days) are fresh. Older endpoints, and endpoints
+    without a resolved_at timestamp, are stale: still used for this run while they are revalidated.
+    Endpoints older than ENDPOINT_TTL + ENDPOINT_STALE_TTL (default 30 days), and missing
+    endpoints, are expired and re-resolved before use.
+    Args:
+        endpoints (dict): cached endpoints
+        now (datetime): Optional, current time
+    Returns:
+        tuple (dict, list, bool): endpoints with expired entries re-resolved, stale locations, True if endpoints changed
+    '''
+    load_dotenv()
+    locations = json.loads(os.getenv("LOCATIONS"))
+    ttl = float(os.getenv("ENDPOINT_TTL", str(7 * 24 * 3600)))
+    stale_ttl = float(os.getenv("ENDPOINT_STALE_TTL", str(30 * 24 * 3600)))
+    if now == None:
+        now = datetime.now(pytz.UTC)
+
+    endpoints = dict(endpoints)
+    expired = []
+    stale = []
+    for location in locations.keys():
+        endpoint = endpoints.get(location)
+        age = endpoint_age(endpoint, now)
+        if endpoint_url(endpoint) == None or (age != None and age >= ttl + stale_ttl):
+            expired.append(location)
+        elif age == None or age >= ttl:
+            stale.append(location)
+
+    changed = False
+    if len(expired) > 0:
+        logging.info(f'\n\nRESOLVING EXPIRED ENDPOINTS: {expired}\n\n')
+        resolved = get_endpoints(expired)
+        if resolved:
+            endpoints.update(resolved)
+            changed = True
+
+    return (endpoints, stale, changed)
+
+def save_endpoints(endpoints, default_credential, resolved=None):
+    '''Write endpoints cache to blob
+    Args:
+        endpoints (dict): endpoints used by this run, updated in place with resolved
+        resolved (dict): Optional, newly resolved endpoints
+    Returns:
+        None
+    '''
+    func_account_url = os.getenv("BLOB_ACCOUNT_URL")
+    # Update and write under one lock so concurrent refreshes cannot overwrite each other
+    with _save_lock:
+        if resolved:
+            endpoints.update(resolved)
+        blob_input = json.dumps(endpoints, sort_keys=False, indent=4)
+        utils.writeblob('noaa_api_endpoints.json', blob_input, 'skiforecast', func_account_url, default_credential, True)
+
+def revalidate_endpoints(endpoints, stale, default_credential):
+    '''Re-resolve stale endpoints and update the endpoints cache, run in the background
+    Args:
+        endpoints (dict): endpoints used by this run, updated in place
+        stale (list): stale location names
+    Returns:
+        endpoints (dict): endpoints
+    '''
+    resolved = get_endpoints(stale)
+    if resolved:
+        save_endpoints(endpoints, default_credential, resolved)
+        logging.info(f'\n\nREVALIDATED ENDPOINTS: {list(resolved.keys())}\n\n')
+    return endpoints
+
+def resolve_endpoint(location, endpoints, default_credential):
+    '''Re-resolve the endpoint of a single location after a failed fetch
+    Updates the endpoints used by this run and the endpoints cache blob.
+    Args:
+        location (str): location name
+        endpoints (dict): endpoints used by this run, updated in place
+    Returns:
+        url (str): new forecastGridData url, None if the location could not be resolved
+    '''
+    logging.info(f'\n\nRESOLVING ENDPOINT: {location}\n\n')
+    resolved = get_endpoints([location])
+    if not resolved or location not in resolved:
+        return None
+    save_endpoints(endpoints, default_credential, resolved)
+    return endpoint_url(resolved[location])
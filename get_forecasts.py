@@ -1,21 +1,96 @@
 import os
 import json
-import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import get_endpoints as get_endpoints
 import utils as utils
+import storage as storage
+import fetch_utils as fetch_utils
 import logging
 
-def get_forecasts(default_credential, endpoints):
+def fetch_forecasts(locations, endpoints, header, limiter=None, workers=1, session=None, policy=None, refresh=None, properties=None, compact=False, fetched=None):
+    '''Fetch forecast data for ski area locations, concurrently if workers > 1
+    Locations in the same NWS grid cell share one request.
+    Args:
+        locations (dict) : {location name: [(lat, long), (base elev., summit elev.), (ski area url,)]}
+        endpoints (dict) : {location: endpoint}, see get_endpoints
+        header (dict) : header for requests
+        limiter (TokenBucket) : shared rate limiter for NOAA API requests
+        workers (int) : number of concurrent requests
+        session (NOAASession) : pooled session sending conditional GETs
+        policy (RetryPolicy) : retry policy for failed requests, if None make a single attempt
+        refresh (callable) : (location) -> new endpoint or None, called before retrying a stale endpoint
+        properties (iterable) : forecast properties to keep, if None keep the full response
+        compact (bool) : serialize forecasts in the compact, gzip compressed format
+        fetched (callable) : (location, GridData or None) called as soon as each location's forecast is ready,
+                             e.g., to start writing it while other grid cells are still fetching
+    Returns:
+        forecasts (dict) : {location: GridData}, in order of locations; None if the circuit breaker was open
+    '''
+
+    # Group locations by grid cell, endpoints may be re-resolved while fetching
+    cells = {}
+    location_cells = {}
+    for location in locations.keys():
+        location_cells[location] = get_endpoints.grid_cell(endpoints[location])
+        cells.setdefault(location_cells[location], []).append(location)
+
+    def fetch(cell):
+        location = cells[cell][0]
+        endpoint = [get_endpoints.endpoint_url(endpoints[location])]
+
+        def request():
+            forecast = utils.GridData(location, locations[location], endpoint[0], header, limiter, session, cell, properties, compact)
+            forecast.get_forecast()
+            status = forecast.get_status()
+            return (forecast, status[0], status[1], fetch_utils.parse_retry_after(forecast.get_retry_after()))
+
+        def refresh_endpoint():
+            new_endpoint = refresh(location)
+            if new_endpoint != None:
+                endpoint[0] = new_endpoint
+
+        if policy == None:
+            forecast = request()[0]
+        else:
+            forecast = policy.call(fetch_utils.breaker_key(endpoint[0]), request, refresh_endpoint if refresh != None else None)
+
+        # Share the grid cell download with co-located locations
+        results = {}
+        for cell_location in cells[cell]:
+            if forecast != None and cell_location != location:
+                results[cell_location] = forecast.share(cell_location, locations[cell_location])
+            else:
+                results[cell_location] = forecast
+            if fetched != None:
+                fetched(cell_location, results[cell_location])
+        return results
+
+    results = {}
+    if workers > 1 and limiter != None:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for cell_results in executor.map(fetch, cells.keys()):
+                results.update(cell_results)
+    else:
+        for cell in cells.keys():
+            results.update(fetch(cell))
+
+    return {location: results[location] for location in locations.keys()}
+
+def get_forecasts(default_credential, endpoints, unchanged=None, payloads=None, pending=None):
     '''Get forecast data for ski area locations, save to blob, return list of blob names
     Args:
         endpoints (dict): Dictionary of endpoints for each location
+        unchanged (set): Optional, filled with locations whose saved forecast is still current (HTTP 304)
+        payloads (dict): Optional, filled with {location: decoded forecast} so processing can skip reading the blobs back
+        pending (list): Optional, filled with futures of blob writes still running; if None wait for writes before returning
     Returns:
         forecast_blobs (dict): Dict of location:blob names for retrieved forecasts'''
 
     # Load environment variables
     load_dotenv(".env")
     locations = json.loads(os.getenv("LOCATIONS"))
+    properties = json.loads(os.getenv("PROPERTIES"))
     PURPOSE = os.getenv("PURPOSE")
     EMAIL = os.getenv("EMAIL")
 
@@ -25,141 +100,85 @@ def get_forecasts(default_credential, endpoints):
     # Define parameters
     func_account_url = os.getenv('BLOB_ACCOUNT_URL')
     container_name = "skiforecast"
+    limiter = fetch_utils.get_rate_limiter()
+    workers = fetch_utils.get_fetch_workers()
+    session = fetch_utils.get_session(header)
+    policy = fetch_utils.get_retry_policy()
+    validators_file = 'noaa_validators.json'
+    forecast_format = os.getenv("GRIDDATA_FORMAT", "compact")   # 'compact' or 'json'
+    compact = forecast_format == 'compact'
+    properties_digest = storage.content_hash(json.dumps(properties, sort_keys=True))   # Blobs hold only the configured properties
+    if unchanged == None:
+        unchanged = set()
+    if payloads == None:
+        payloads = {}
+
+    # Load ETag / Last-Modified validators saved by the previous run, valid only for blobs in the same format and properties
+    try:
+        blob = utils.readblob(validators_file, container_name, func_account_url, default_credential)
+        saved = json.loads(blob.decode())
+        if 'validators' not in saved:
+            saved = {'format': 'json', 'validators': saved}
+        if saved['format'] == forecast_format and saved.get('properties') == properties_digest:
+            session.set_validators(saved['validators'])
+    except Exception as e:
+        logging.info(f'\n\nNo saved validators, fetching all forecasts: {e}\n\n')
 
     # Fetch forecast data
-    # Get forecast data for each location, confirm successful download, save raw as .json
+    # Get forecast data for each location, retrying failures, confirm successful download, save raw as .json
     fails = {} # Accumulate fails in dictionary {location: (HTTPStatus, HTTPError)}
-    resolved = {} # Accumulate resolved fails in dictionary {location: 'location'}
     forecast_blobs = {} # Accumulate forecast blob names in list
 
-    for location in locations.keys():
-        location_details = locations[location]
-        endpoint = endpoints[location]
-        blob_name = f'{location}_gridData.json'
-        forecast = utils.GridData(location, location_details, endpoint, header)
-        data = forecast.get_forecast()
+    # Re-resolve only the failing location's endpoint before retrying
+    def refresh(location):
+        return get_endpoints.resolve_endpoint(location, endpoints, default_credential)
+
+    # Write each forecast as soon as it is fetched, writes overlap with the remaining requests
+    blob_storage = storage.get_storage(func_account_url, default_credential)
+    writes = {}
+    def fetched(location, forecast):
+        if forecast != None and forecast.get_status()[1] == False and not forecast.is_not_modified():
+            writes[location] = blob_storage.submit(utils.writeblob, utils.forecast_blob_name(location, compact), forecast.get_blob(), container_name, func_account_url, default_credential, True)
+
+    forecasts = fetch_forecasts(locations, endpoints, header, limiter, workers, session, policy, refresh, properties.keys(), compact, fetched)
+    for location, forecast in forecasts.items():
+        blob_name = utils.forecast_blob_name(location, compact)
+        if forecast == None:
+            fails[location] = (None, True)
+            continue
         response = forecast.get_status()
-        if response[1] == False:
-            utils.writeblob(blob_name, data, container_name, func_account_url, default_credential)
-            forecast_blobs[location] = f'{location}_gridData.json'
+        if forecast.is_not_modified():
+            forecast_blobs[location] = blob_name
+            unchanged.add(location)
+        elif response[1] == False:
+            forecast_blobs[location] = blob_name
+            payloads[location] = forecast.get_data()
         elif response[1] == True:
             fails[location] = response
 
-    location = None
-    location_details = None
-    endpoint = None
-
-    # Handle missed endpoints
-    # Pass if all endpoints are found
-    if len(fails) == 0:
-        logging.info(f'\n\nFAILS: {fails}\n\n')
-        pass
-    # If endpoints are missing, attempt to resolve
-    elif len(fails) > 0:
-        logging.info(f'\n\nFAILS: {fails}\n\n')
-        for location in fails.keys():
-            logging.info(f'\n\nATTEMPTING TO RESOLVE: {location}\n\n')
-            http_status = fails[location][0]
-            http_error = fails[location][1]
-            location_details = locations[location]
-            endpoint = endpoints[location]
-            blob_name = f'{location}_gridData.json'
-            if http_status == None and http_error == True:
-                logging.info(f'\n\nFETCHING NEW ENDPOINTS\n\n')
-                ep = get_endpoints.get_endpoints()
-                forecast = utils.GridData(location, location_details, endpoint, header)
-                data = forecast.get_forecast()
-                response = forecast.get_status()
-                if response == (200, False):
-                    resolved[location] = location   # Add location to list of resolved endpoints
-                    utils.writeblob(blob_name, data, container_name, func_account_url, default_credential)
-                    forecast_blobs[location] = f'{location}_gridData.json'
-                    logging.info(f'\n\nRESOLVED -- LOCATION: {location}, RESPONSE: {response}\n\n')
-                elif response[1] == True:
-                    time.sleep(0.2)
-                    fails[location] = response      # Update fails list with new response
-                    forecast = utils.GridData(location, location_details, endpoint, header)
-                    data = forecast.get_forecast()
-                    response = forecast.get_status()
-                    if response == (200, False):
-                        resolved[location] = location   # Add location to list of resolved endpoints
-                        utils.writeblob(blob_name, data, container_name, func_account_url, default_credential)
-                        forecast_blobs[location] = f'{location}_gridData.json'
-                        logging.info(f'\n\nRESOLVED -- LOCATION: {location}, RESPONSE: {response}\n\n')
-                    if response[1] == True:
-                        logging.info(f'\n\nCOULD NOT RESOLVE -- LOCATION: {location}, RESPONSE: {response}\n\n')
-            elif http_status != None and ((300 <= http_status < 500) and http_error == True):
-                logging.info(f'\n\nFETCHING NEW ENDPOINTS\n\n')
-                ep = get_endpoints.get_endpoints()
-                forecast = utils.GridData(location, location_details, endpoint, header)
-                data = forecast.get_forecast()
-                response = forecast.get_status()
-                if response == (200, False):
-                    resolved[location] = location   # Add location to list of resolved endpoints
-                    utils.writeblob(blob_name, data, container_name, func_account_url, default_credential)
-                    forecast_blobs[location] = f'{location}_gridData.json'
-                    logging.info(f'\n\nRESOLVED -- LOCATION: {location}, RESPONSE: {response}\n\n')
-                elif response[1] == True:
-                    time.sleep(0.2)
-                    fails[location] = response      # Update fails list with new response
-                    forecast = utils.GridData(location, location_details, endpoint, header)
-                    data = forecast.get_forecast()
-                    response = forecast.get_status()
-                    if response == (200, False):
-                        resolved[location] = location   # Add location to list of resolved endpoints
-                        utils.writeblob(blob_name, data, container_name, func_account_url, default_credential)
-                        forecast_blobs[location] = f'{location}_gridData.json'
-                        logging.info(f'\n\nRESOLVED -- LOCATION: {location}, RESPONSE: {response}\n\n')
-                    if response[1] == True:
-                        logging.info(f'\n\nCOULD NOT RESOLVE -- LOCATION: {location}, RESPONSE: {response}\n\n')
-            elif http_status != None and ((500 <= http_status < 600) and http_error == True):
-                forecast = utils.GridData(location, location_details, endpoint, header)
-                data = forecast.get_forecast()
-                response = forecast.get_status()
-                if response == (200, False):
-                    resolved[location] = location   # Add location to list of resolved endpoints
-                    utils.writeblob(blob_name, data, container_name, func_account_url, default_credential)
-                    forecast_blobs[location] = f'{location}_gridData.json'
-                    logging.info(f'\n\nRESOLVED -- LOCATION: {location}, RESPONSE: {response}\n\n')
-                elif response[1] == True:
-                    time.sleep(0.2)
-                    fails[location] = response      # Update fails list with new response
-                    forecast = utils.GridData(location, location_details, endpoint, header)
-                    data = forecast.get_forecast()
-                    response = forecast.get_status()
-                    if response == (200, False):
-                        resolved[location] = location   # Add location to list of resolved endpoints
-                        utils.writeblob(blob_name, data, container_name, func_account_url, default_credential)
-                        forecast_blobs[location] = f'{location}_gridData.json'
-                        logging.info(f'\n\nRESOLVED -- LOCATION: {location}, RESPONSE: {response}\n\n')
-                    elif response[1] == True:
-                        time.sleep(0.2)
-                        fails[location] = response      # Update fails list with new response
-                        forecast = utils.GridData(location, location_details, endpoint, header)
-                        data = forecast.get_forecast()
-                        response = forecast.get_status()
-                        if response == (200, False):
-                            resolved[location] = location   # Add location to list of resolved endpoints
-                            utils.writeblob(blob_name, data, container_name, func_account_url, default_credential)
-                            forecast_blobs[location] = f'{location}_gridData.json'
-                            logging.info(f'\n\nRESOLVED -- LOCATION: {location}, RESPONSE: {response}\n\n')
-                        if response[1] == True:
-                            logging.info(f'\n\nCOULD NOT RESOLVE -- LOCATION: {location}, RESPONSE: {response}\n\n')
-        
-            location = None
-            location_details = None
-            endpoint = None
-            
-        # Remove resolved fails from fails list
-        for key in resolved.keys():
-            if key in fails.keys():
-                del fails[key]
-
-        # Log unresolved fails
-        if len(fails) != 0:
-            for key in resolved.keys():
-                if key in fails.keys():
-                    del fails[key] 
-            logging.info(f'\n\nUNRESOLVED FAILS: {fails}\n\n')
+    logging.info(f'\n\nUNRESOLVED FAILS: {fails}\n\n')
+    logging.info(f'\n\nRETRY STATS: {policy.get_stats()}\n\n')
+
+    # Save validators only for urls whose blobs are all stored, a 304 of the next run must find the blob
+    # of every location on the url, co-located locations share one
+    # Wait here, pool tasks must not wait on each other, see storage.StorageSession.submit
+    stored = {}
+    for location in forecasts.keys():
+        url = get_endpoints.endpoint_url(endpoints.get(location))
+        written = location in unchanged or (location in writes and writes[location].result())
+        stored[url] = stored.get(url, True) and written
+    writes = list(writes.values())
+    try:
+        validators = session.get_validators(url for url, written in stored.items() if written)
+        writes.append(blob_storage.submit(utils.writeblob, validators_file, json.dumps({'format': forecast_format, 'properties': properties_digest, 'validators': validators}), container_name, func_account_url, default_credential, True))
+    except Exception as e:
+        logging.info(f'\n\nError saving validators: {e}\n\n')
+
+    # Validators write finishes in the background if the caller waits for it
+    if pending != None:
+        pending.extend(writes)
+    else:
+        for write in writes:
+            write.result()
 
     return forecast_blobs
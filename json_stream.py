@@ -0,0 +1,176 @@
+import re
+import json
+import zlib
+import codecs
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+# gridData properties kept besides the configured forecast properties
+GRIDDATA_METADATA = ['updateTime', 'validTimes', 'elevation']
+
+def griddata_select(properties):
+    '''Return selection for a NOAA forecastGridData response
+    Args:
+        properties (iterable) : forecast property names, e.g., keys of PROPERTIES
+    Returns:
+        select (dict) : selection for decode
+    '''
+    select = {key: True for key in GRIDDATA_METADATA}
+    select.update({property: True for property in properties})
+    return {'properties': select}
+
+def forecast_select(properties):
+    '''Return selection for a {location}_gridData.json forecast blob
+    Args:
+        properties (iterable) : forecast property names, e.g., keys of PROPERTIES
+    Returns:
+        select (dict) : selection for decode
+    '''
+    return {'format_version': True, 'lat_long': True, 'elev': True, 'href': True, 'grid_cell': True, 'data': griddata_select(properties)}
+
+def gunzip(chunks):
+    '''Decompress a stream of chunks if it is gzip compressed
+    Args:
+        chunks (iterable) : bytes chunks
+    Returns:
+        chunks (generator) : decompressed chunks, input chunks unchanged if not gzip compressed
+    '''
+    chunks = iter(chunks)
+    head = b''
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= 2:
+            break
+    if head[:2] != b'\x1f\x8b':
+        yield head
+        yield from chunks
+        return
+
+    inflater = zlib.decompressobj(wbits = 31)
+    yield inflater.decompress(head)
+    for chunk in chunks:
+        yield inflater.decompress(chunk)
+    yield inflater.flush()
+
+def decode(chunks, select):
+    '''Decode a JSON object from a stream of chunks, keeping only selected keys
+    Args:
+        chunks (iterable) : str or bytes (utf-8) chunks, e.g., Response.iter_content() or StorageStreamDownloader.chunks()
+        select (dict) : {key: True} keeps the value, {key: {...}} descends into an object value,
+                        other keys are skipped
+    Returns:
+        data (dict) : decoded object with selected keys only
+    '''
+    return ProjectingDecoder(chunks).decode(select)
+
+
+
+class ProjectingDecoder:
+    '''Incremental JSON decoder that materializes only selected object keys
+    Only a window of the input is buffered. Selected values are decoded with the C json decoder;
+    skipped values are decoded one at a time and dropped, so at most one property is held in memory
+    besides the selected ones.
+    '''
+
+    def __init__(self, chunks):
+        '''Initialize ProjectingDecoder object
+        Args:
+            chunks (iterable) : str or bytes (utf-8) chunks
+        Returns:
+            None
+        '''
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def decode(self, select):
+        '''Decode the top level object
+        Args:
+            select (dict) : selection, see decode
+        Returns:
+            data (dict) : decoded object with selected keys only
+        '''
+        data = self._object(select)
+        # Drain trailing input so pooled connections are released
+        for _ in self._chunks:
+            pass
+        return data
+
+    def _fill(self, size=1):
+        '''Drop consumed input and read at least size more characters, return False at end of input'''
+        parts = [self._buffer[self._pos:]]
+        read = 0
+        while read < size:
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                self._eof = True
+                parts.append(self._utf8.decode(b'', final=True))
+                break
+            if isinstance(chunk, bytes):
+                chunk = self._utf8.decode(chunk)
+            parts.append(chunk)
+            read += len(chunk)
+        self._buffer = ''.join(parts)
+        self._pos = 0
+        return read > 0
+
+    def _char(self):
+        '''Skip whitespace, return next character'''
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if self._eof or not self._fill():
+                raise ValueError('Unexpected end of JSON input')
+
+    def _expect(self, char):
+        '''Consume char'''
+        if self._char() != char:
+            raise ValueError(f'Expected {char!r} at position {self._pos}: {self._buffer[self._pos:self._pos + 20]!r}')
+        self._pos += 1
+
+    def _value(self):
+        '''Decode the next value, reading more input until it is complete'''
+        self._char()
+        size = 1
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            # Double the window so long values are decoded O(length) times in total
+            size = max(size, len(self._buffer) - self._pos)
+            self._fill(size)
+
+    def _object(self, select):
+        '''Decode an object, keeping selected keys'''
+        self._expect('{')
+        result = {}
+        if self._char() == '}':
+            self._pos += 1
+            return result
+        while True:
+            key = self._value()
+            self._expect(':')
+            spec = select.get(key)
+            if spec is True:
+                result[key] = self._value()
+            elif isinstance(spec, dict) and self._char() == '{':
+                result[key] = self._object(spec)
+            else:
+                self._value()   # Skip
+            char = self._char()
+            self._pos += 1
+            if char == '}':
+                return result
+            elif char != ',':
+                raise ValueError(f'Expected \',\' or \'}}\' at position {self._pos - 1}')
@@ -1,14 +1,24 @@
 import os
 import json
+import dataclasses
 from dotenv import load_dotenv
 import utils as utils
+import aggregation as aggregation
+import status_rules as status_rules
+import forecast_state as forecast_state
+import forecast_model as forecast_model
+import storage as storage
+import json_stream as json_stream
 import logging
 
-def proc_forecasts(default_credential, time, forecasts):
+def proc_forecasts(default_credential, time, forecasts, unchanged=None, payloads=None, pending=None):
     '''Create table data from forecast data
     Args:
         time (datetime): Current time
         forecasts (dict): Dictionary of location: blob names
+        unchanged (set): Optional, locations whose forecast is unchanged since the previous run
+        payloads (dict): Optional, {location: decoded forecast} handed over by get_forecasts, read from blob otherwise
+        pending (list): Optional, filled with futures of blob writes still running; if None wait for writes before returning
     Returns:
         table (Table): Table object'''
     
@@ -19,44 +29,148 @@ def proc_forecasts(default_credential, time, forecasts):
     locations = json.loads(os.getenv("LOCATIONS"))
     time_periods = json.loads(os.getenv("TIME_PERIODS"))
     properties = json.loads(os.getenv("PROPERTIES"))
+    rules_config = json.loads(os.getenv("STATUS_RULES", "{}"))
+    rules = status_rules.StatusRules(rules_config)
     func_account_url = os.getenv("BLOB_ACCOUNT_URL")
     container_name = "skiforecast"
+    if unchanged == None:
+        unchanged = set()
+    if payloads == None:
+        payloads = {}
     
+    # Weather codes are interned per run
+    forecast_model.reset_weather()
+
     # Create table data from forecast data
     # Create Table object
     table = utils.Table()
     # Create table columns
     table.create_columns(time)
 
+    # Download and decode forecasts concurrently, rows are still built in location order
+    blob_storage = storage.get_storage(func_account_url, default_credential)
+    select = json_stream.forecast_select(properties.keys())
+    def read_forecast(blob_name):
+        chunks = json_stream.gunzip(utils.streamblob(blob_name, container_name, func_account_url, default_credential))
+        return json_stream.decode(chunks, select)
+
+    state_read = blob_storage.submit(utils.readblob, forecast_state.STATE_BLOB, container_name, func_account_url, default_credential)
+    previous_read = None
+    if unchanged:
+        previous_read = blob_storage.submit(utils.readblob, "tableData.json", container_name, func_account_url, default_credential)
+    reads = {location: blob_storage.submit(read_forecast, forecasts[location])
+             for location in locations.keys()
+             if location in forecasts and location not in unchanged and location not in payloads}
+
+    # Reuse rows of the previous table for unchanged forecasts covering the same dates
+    previous_rows = {}
+    def load_previous_rows(previous_read):
+        try:
+            previous = json.loads(previous_read.result().decode())
+            if previous['columns'] == table.get_columns():
+                for row in previous['rows']:
+                    previous_rows[row[0][0].split('\n')[0]] = row
+        except Exception as e:
+            logging.info(f'\n\nError reading previous table: {e}\n\n')
+    if previous_read != None:
+        load_previous_rows(previous_read)
+
+    parsed_cells = {}   # Parsed forecasts by grid cell, shared by co-located locations
+    parsed_forecasts = {}
+    update_times = {}
+    setups = {}
+    unsupported = set() # Forecasts in a newer format, never parsed
+
     for location in locations.keys():
+        if location in unchanged and location in previous_rows:
+            continue
+
         try:
-            blob_data = utils.readblob(forecasts[location], container_name, func_account_url, default_credential)
-            blob_data = json.loads(blob_data.decode())
+            if location in payloads:
+                blob_data = payloads[location]
+            else:
+                if location not in reads:
+                    reads[location] = blob_storage.submit(read_forecast, forecasts[location])
+                blob_data = reads.pop(location).result()
+            if blob_data.get('format_version', 1) > utils.FORECAST_FORMAT_VERSION:
+                logging.info(f'\n\nUnsupported forecast format, keeping previous row, {location}: {blob_data["format_version"]}\n\n')
+                unsupported.add(location)
+                continue
         except Exception as e:
             logging.info(f'\n\nError reading forecast, {location}: {e}\n\n')
 
         # Instantiate TableData object
-        setup = utils.TableData(time, location, time_periods, properties)
+        setup = utils.TableData(time, location, time_periods, properties, rules)
+        setups[location] = setup
         
-        # Parse forecast data
+        # Parse forecast data, once per grid cell
         try:
-            parsed = setup.parse_forecast(blob_data)
+            cell = blob_data.get('grid_cell')
+            if cell != None and cell in parsed_cells:
+                # Hourly values are shared, calculating table data does not modify them
+                parsed = dataclasses.replace(parsed_cells[cell], lat_long=blob_data['lat_long'], elev=blob_data['elev'], href=blob_data['href'])
+            else:
+                parsed = setup.parse_forecast(blob_data)
+                if cell != None:
+                    parsed_cells[cell] = parsed
+            parsed_forecasts[location] = parsed
+            update_times[location] = blob_data['data']['properties'].get('updateTime')
         except Exception as e:
             logging.info(f'\n\nError parsing forecast, {location}: {e}\n\n')
 
-        # Calculate table data
+    # Rows of unsupported forecasts come from the previous table, read unless unchanged forecasts read it
+    if unsupported and previous_read == None:
+        load_previous_rows(blob_storage.submit(utils.readblob, "tableData.json", container_name, func_account_url, default_credential))
+
+    # Compare forecasts with the previous run, only (property, day) slices whose values changed are recomputed
+    saved_state = None
+    try:
+        saved_state = json.loads(state_read.result().decode())
+    except Exception as e:
+        logging.info(f'\n\nNo saved forecast state, calculating all days: {e}\n\n')
+    state = forecast_state.ForecastState(time, time_periods, saved_state)
+    for location, parsed in parsed_forecasts.items():
+        config = forecast_state.config_key(time_periods, properties, rules_config, locations[location], parsed.elev)
+        state.compare(location, config, parsed, update_times.get(location))
+
+    # Aggregate changed slices of all locations in one batch, reuse saved results otherwise
+    aggregates = aggregation.aggregate_forecasts(time, time_periods, properties, parsed_forecasts, state.get_slices())
+    state.merge(aggregates)
+
+    # Calculate table data, statuses of all locations are scored in one batch
+    tables = {}
+    for location, setup in setups.items():
         try:
-            table_data = setup.calculate_table_data(parsed)
+            tables[location] = setup.calculate_table_data(parsed_forecasts[location], aggregates[location], score=False)
         except Exception as e:
             logging.info(f'\n\nError calculating table data, {location}: {e}\n\n')
+    rules.score(tables)
 
-        # Create table row
+    for location in locations.keys():
+        if location in unchanged and location in previous_rows:
+            table.append_row(previous_rows[location])
+            continue
+        if location in unsupported:
+            if location in previous_rows:
+                table.append_row(previous_rows[location])
+            continue
+        setup = setups[location]
+
+        # Create table row, cells of unchanged days are reused
         try:
-            row = setup.create_row(table_data)
+            row = setup.create_row(tables[location], state.get_cells(location))
+            state.set_row(location, row)
         except Exception as e:
             logging.info(f'\n\nError creating table row, {location}: {e}\n\n')
 
         # Append row to table
         table.append_row(row)
 
+    # Save state for the next run
+    write = blob_storage.submit(utils.writeblob, forecast_state.STATE_BLOB, state.dumps(), container_name, func_account_url, default_credential)
+    if pending != None:
+        pending.append(write)
+    else:
+        write.result()
+
     return table.get_table()
@@ -0,0 +1,146 @@
+import copy
+import operator
+
+# Comparisons of rule conditions
+OPERATORS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge, '==': operator.eq, '!=': operator.ne}
+
+# Default go/no-go rules, {property: {'rules': [{'status': status, 'when': [[value, operator, threshold]]}], 'default': status}}
+# The first rule whose conditions all hold sets the status, the default applies otherwise.
+# Values are calculations of the property, e.g., 'max', in the units of PROPERTIES, or 'rain' and 'snow' for weather;
+# thresholds are numbers or 'base' and 'summit' elevations of the location.
+DEFAULT_RULES = {
+    'temperature': {'rules': [{'status': 1, 'when': [['max', '>=', 35]]},
+                              {'status': 1, 'when': [['min', '<', 10]]},
+                              {'status': 2, 'when': [['max', '>', 33]]},
+                              {'status': 2, 'when': [['min', '<', 15]]}],
+                    'default': 3},
+    'skyCover': {'rules': [], 'default': 3},
+    'windDirection': {'rules': [], 'default': 3},
+    'windSpeed': {'rules': [{'status': 1, 'when': [['avg', '>=', 35]]},
+                            {'status': 2, 'when': [['avg', '>=', 20]]}],
+                  'default': 3},
+    'windGust': {'rules': [{'status': 1, 'when': [['max', '>=', 45]]},
+                           {'status': 2, 'when': [['max', '>=', 35]]}],
+                 'default': 3},
+    'weather': {'rules': [{'status': 1, 'when': [['rain', '==', True], ['snow', '==', False]]},
+                          {'status': 2, 'when': [['rain', '==', True]]}],
+                'default': 3},
+    'probabilityOfPrecipitation': {'rules': [], 'default': 3},
+    'quantitativePrecipitation': {'rules': [], 'default': 3},
+    'snowfallAmount': {'rules': [{'status': 2, 'when': [['sum', '<', 1.1]]}],
+                       'default': 3},
+    'snowLevel': {'rules': [{'status': 3, 'when': [['max', '<', 'base']]},
+                            {'status': 2, 'when': [['max', '<', 'summit']]}],
+                  'default': 1},
+}
+
+# Status of snow level without values
+MISSING_SNOW_LEVEL = 2
+
+def weather_values(data):
+    '''Return rule values of weather conditions
+    Args:
+        data (list) : [(time, conditions)], see forecast_model.PropertyResult
+    Returns:
+        values (dict) : {'rain': True if any condition is rain, 'snow': True if any condition is snow}
+    '''
+    conditions = [condition for time, period_conditions in data for condition in period_conditions]
+    return {'rain': any('rain' in condition for condition in conditions),
+            'snow': any('snow' in condition for condition in conditions)}
+
+def evaluate(rules, cells):
+    '''Evaluate rules over many cells, one condition at a time
+    Args:
+        rules (dict) : {'rules': [{'status': status, 'when': [[value, operator, threshold]]}], 'default': status}
+        cells (list) : [{value name: value}]
+    Returns:
+        statuses (list) : status of each cell, None for cells missing a value of the rules
+    '''
+    names = set(condition[0] for rule in rules['rules'] for condition in rule['when'])
+    names.update(condition[2] for rule in rules['rules'] for condition in rule['when'] if isinstance(condition[2], str))
+    statuses = [None] * len(cells)
+    pending = [i for i in range(len(cells)) if all(name in cells[i] for name in names)]
+    for rule in rules['rules']:
+        matched = pending
+        for name, comparison, threshold in rule['when']:
+            compare = OPERATORS[comparison]
+            if isinstance(threshold, str):
+                matched = [i for i in matched if compare(cells[i][name], cells[i][threshold])]
+            else:
+                matched = [i for i in matched if compare(cells[i][name], threshold)]
+        for i in matched:
+            statuses[i] = rule['status']
+        if len(matched) > 0:
+            matched = set(matched)
+            pending = [i for i in pending if i not in matched]
+    for i in pending:
+        statuses[i] = rules['default']
+    return statuses
+
+
+
+class StatusRules:
+    '''Go/no-go rules of forecast properties with per-location overrides
+    Statuses of all locations, days and time periods are scored together: the cells of each
+    property that share rules are evaluated one condition at a time over all of them.
+    '''
+
+    def __init__(self, config=None):
+        '''Initialize StatusRules object
+        Args:
+            config (dict) : Optional, {'rules': {property: rules}, 'locations': {location: {property: rules}}},
+                            rules replace DEFAULT_RULES of a property, for all or one location
+        Returns:
+            None
+        '''
+        if config == None:
+            config = {}
+        self._rules = copy.deepcopy(DEFAULT_RULES)
+        self._rules.update(config.get('rules', {}))
+        self._overrides = config.get('locations', {})
+
+    def get_rules(self, location, property):
+        '''Return rules of a property at a location, None if the property is not scored'''
+        return self._overrides.get(location, {}).get(property, self._rules.get(property))
+
+    def score(self, tables):
+        '''Set statuses of calculated table data
+        Args:
+            tables (dict) : {location: LocationResult}, see TableData.calculate_table_data
+        Returns:
+            None, statuses and overall statuses of each PeriodResult are set in place
+        '''
+        # Collect cells of each property by their rules
+        groups = {}
+        for location, table in tables.items():
+            for day in table.days.values():
+                for period in day.periods.values():
+                    period.status = {}
+                    for property, result in period.data.items():
+                        rules = self.get_rules(location, property)
+                        if rules == None:
+                            continue
+                        if result.data == None:
+                            if property == 'snowLevel':
+                                period.status[property] = MISSING_SNOW_LEVEL
+                            continue
+                        if property == 'weather':
+                            values = weather_values(result.data)
+                        else:
+                            values = {name: value[1] if isinstance(value, tuple) else value for name, value in result.data.items()}
+                            if len(values) == 0:
+                                continue
+                        values['base'] = table.elev[0]
+                        values['summit'] = table.elev[1]
+                        groups.setdefault(id(rules), (rules, []))[1].append((period, property, values))
+
+        for rules, cells in groups.values():
+            for (period, property, values), status in zip(cells, evaluate(rules, [values for period, property, values in cells])):
+                if status != None:
+                    period.status[property] = status
+
+        for table in tables.values():
+            for day in table.days.values():
+                for period in day.periods.values():
+                    period.status = {property: period.status[property] for property in period.data if property in period.status}
+                    period.overall = min(period.status.values(), default=None)
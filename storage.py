@@ -0,0 +1,626 @@
+import os
+import abc
+import json
+import mmap
+import hashlib
+import tempfile
+import threading
+import logging
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotFoundError, ResourceExistsError, ResourceModifiedError
+from azure.storage.blob import BlobServiceClient, ContentSettings
+
+# Chunk size of streamed reads from local and in-memory storage
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# Blob metadata key holding the SHA-256 of the blob content
+HASH_KEY = 'content_sha256'
+
+# Blob indexing the other blobs of a container, see Manifest
+MANIFEST_BLOB = 'manifest.json'
+
+def content_hash(data):
+    '''Return SHA-256 hex digest of blob content
+    Args:
+        data (str or bytes) : content, str is utf-8 encoded
+    Returns:
+        digest (str) : hex digest
+    '''
+    if isinstance(data, str):
+        data = data.encode()
+    return hashlib.sha256(data).hexdigest()
+
+
+_credential = None
+_credential_lock = threading.Lock()
+
+def get_credential():
+    '''Return DefaultAzureCredential shared by every storage client in this process
+    The credential caches its access token, so warm invocations skip the token exchange.
+    Returns:
+        credential (DefaultAzureCredential) : shared credential
+    '''
+    global _credential
+    with _credential_lock:
+        if _credential is None:
+            from azure.identity import DefaultAzureCredential
+            _credential = DefaultAzureCredential()
+    return _credential
+
+
+def get_storage_workers():
+    '''Return number of concurrent blob operations, from STORAGE_WORKERS (default 8)'''
+    try:
+        workers = int(os.getenv("STORAGE_WORKERS", "8"))
+    except ValueError:
+        logging.info(f'\n\nInvalid STORAGE_WORKERS: {os.getenv("STORAGE_WORKERS")}, using 1\n\n')
+        workers = 1
+    return max(workers, 1)
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage(func_account_url=None, default_credential=None):
+    '''Return storage session for the configured backend, reused across warm invocations
+    STORAGE_BACKEND selects 'azure' (default), 'local' or 'memory'. The local backend keeps
+    containers as directories under STORAGE_PATH (default ./storage).
+    Args:
+        func_account_url (str) : URL for Azure Storage account, BLOB_ACCOUNT_URL if None
+        default_credential (obj) : credential for Azure Storage account, shared credential if None
+    Returns:
+        storage (StorageSession) : shared storage session
+    '''
+    global _storage
+    load_dotenv()
+    backend = os.getenv("STORAGE_BACKEND", "azure")
+
+    with _storage_lock:
+        if backend == 'local':
+            path = os.path.abspath(os.getenv("STORAGE_PATH", "storage"))
+            if not isinstance(_storage, LocalStorage) or _storage.get_path() != path:
+                _storage = LocalStorage(path, get_storage_workers())
+        elif backend == 'memory':
+            if not isinstance(_storage, MemoryStorage):
+                _storage = MemoryStorage(get_storage_workers())
+        else:
+            if func_account_url == None:
+                func_account_url = os.getenv("BLOB_ACCOUNT_URL")
+            if default_credential == None:
+                default_credential = get_credential()
+            if not isinstance(_storage, AzureStorage) or _storage.get_account_url() != func_account_url or _storage.get_credential() is not default_credential:
+                _storage = AzureStorage(func_account_url, default_credential, get_storage_workers())
+    return _storage
+
+
+
+class StorageSession(abc.ABC):
+    '''Blob storage backend
+    Backends implement the abstract _write, read, stream, get_metadata, list_blobs and the
+    conditional read_versioned / write_versioned, and may override exists. Blob operations
+    submitted to the session run on a bounded thread pool, so storage round-trips overlap
+    instead of adding up.
+    '''
+
+    def __init__(self, workers=8):
+        '''Initialize StorageSession object
+        Args:
+            workers (int) : number of concurrent blob operations
+        Returns:
+            None
+        '''
+        self._workers = workers
+        self._executor = None
+        self._manifests = {}
+        self._lock = threading.Lock()
+
+    def write(self, container_name, blob_name, data, content_type=None, metadata=None):
+        '''Write blob, replacing an existing blob
+        Args:
+            container_name (str) : name of container
+            blob_name (str) : name of blob
+            data (str or bytes) : content, str is utf-8 encoded
+            content_type (str) : Optional, content type, e.g., 'text/html'
+            metadata (dict) : Optional, {name: str value} stored with the blob
+        Returns:
+            None
+        '''
+        self._write(container_name, blob_name, data, content_type, metadata)
+        manifest = self._manifests.get(container_name)
+        if manifest != None:
+            manifest.discard(blob_name)
+
+    @abc.abstractmethod
+    def _write(self, container_name, blob_name, data, content_type=None, metadata=None):
+        '''Backend write, see write'''
+
+    def write_if_changed(self, container_name, blob_name, data, content_type=None):
+        '''Write blob unless the stored blob has the same content hash
+        Args:
+            container_name (str) : name of container
+            blob_name (str) : name of blob
+            data (str or bytes) : content, str is utf-8 encoded
+            content_type (str) : Optional, content type, e.g., 'text/html'
+        Returns:
+            written (bool) : False if the write was skipped
+        '''
+        if isinstance(data, str):
+            data = data.encode()
+        digest = content_hash(data)
+
+        # A manifest entry with another hash answers without a request. The manifest is only a hint:
+        # a matching or missing entry is checked against the blob, which may have been deleted or
+        # overwritten outside the pipeline, or listed by a manifest left stale by a failed commit
+        manifest = self._manifests.get(container_name)
+        entry = manifest.get(blob_name) if manifest != None else None
+        stored = None
+        if entry == None or entry['hash'] == digest:
+            metadata = self.get_metadata(container_name, blob_name)
+            stored = metadata.get(HASH_KEY) if metadata != None else None
+
+        written = stored != digest
+        if written:
+            self.write(container_name, blob_name, data, content_type, {HASH_KEY: digest})
+        if manifest != None and (written or entry == None):
+            manifest.record(blob_name, digest, len(data))
+        return written
+
+    @abc.abstractmethod
+    def get_metadata(self, container_name, blob_name):
+        '''Return blob metadata, None if the blob does not exist'''
+
+    @abc.abstractmethod
+    def read(self, container_name, blob_name):
+        '''Return blob content as bytes'''
+
+    @abc.abstractmethod
+    def stream(self, container_name, blob_name):
+        '''Return blob content as an iterator of bytes chunks'''
+
+    def exists(self, container_name, blob_name):
+        '''Return True if the blob exists'''
+        return blob_name in self.list_blobs(container_name)
+
+    @abc.abstractmethod
+    def list_blobs(self, container_name):
+        '''Return names of blobs in a container'''
+
+    @abc.abstractmethod
+    def read_versioned(self, container_name, blob_name):
+        '''Read blob with its version tag, for read-modify-write updates
+        Args:
+            container_name (str) : name of container
+            blob_name (str) : name of blob
+        Returns:
+            tuple (bytes, str) : content and ETag, (None, None) if the blob does not exist
+        '''
+
+    @abc.abstractmethod
+    def write_versioned(self, container_name, blob_name, data, etag):
+        '''Write blob only if it is unchanged since it was read
+        Args:
+            container_name (str) : name of container
+            blob_name (str) : name of blob
+            data (str or bytes) : content
+            etag (str) : ETag from read_versioned, None to create a blob that must not exist
+        Returns:
+            etag (str) : new ETag, None if another writer changed the blob first
+        '''
+
+    def get_manifest(self, container_name, reload=False):
+        '''Return the manifest of a container, loading it with a single read
+        Once loaded, write_if_changed compares against the manifest and records writes in it.
+        Args:
+            container_name (str) : name of container
+            reload (bool) : read the manifest again, e.g., at the start of an invocation
+        Returns:
+            manifest (Manifest) : container manifest
+        '''
+        with self._lock:
+            manifest = self._manifests.get(container_name)
+        if manifest == None or reload:
+            manifest = Manifest(self, container_name).load()
+            with self._lock:
+                self._manifests[container_name] = manifest
+        return manifest
+
+    def submit(self, fn, *args, **kwargs):
+        '''Run a blob operation on the session thread pool
+        Tasks must not wait on other tasks submitted to the same session.
+        Args:
+            fn (callable) : blob operation, e.g., utils.writeblob
+        Returns:
+            future (Future) : result of fn(*args, **kwargs)
+        '''
+        with self._lock:
+            if self._executor == None:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='storage')
+        return self._executor.submit(fn, *args, **kwargs)
+
+
+
+class AzureStorage(StorageSession):
+    '''Azure Storage clients for one account, created once and reused
+    Container clients share the service client's connection pool and credential,
+    so blob operations after the first skip client setup and token negotiation.
+    '''
+
+    def __init__(self, func_account_url, default_credential, workers=8):
+        '''Initialize AzureStorage object
+        Args:
+            func_account_url (str) : URL for Azure Storage account
+            default_credential (obj) : credential for Azure Storage account
+            workers (int) : number of concurrent blob operations
+        Returns:
+            None
+        '''
+        super().__init__(workers)
+        self._account_url = func_account_url
+        self._credential = default_credential
+        self._service_client = BlobServiceClient(account_url=func_account_url, credential=default_credential)
+        self._containers = {}
+
+    def get_account_url(self):
+        '''Return storage account URL'''
+        return self._account_url
+
+    def get_credential(self):
+        '''Return storage credential'''
+        return self._credential
+
+    def get_service_client(self):
+        '''Return BlobServiceClient'''
+        return self._service_client
+
+    def get_container_client(self, container_name):
+        '''Return pooled ContainerClient for a container
+        Args:
+            container_name (str) : name of container
+        Returns:
+            container (ContainerClient) : container client
+        '''
+        with self._lock:
+            container = self._containers.get(container_name)
+            if container == None:
+                container = self._service_client.get_container_client(container_name)
+                self._containers[container_name] = container
+        return container
+
+    def get_blob_client(self, container_name, blob_name):
+        '''Return BlobClient sharing the container client's connection pool
+        Args:
+            container_name (str) : name of container
+            blob_name (str) : name of blob
+        Returns:
+            blob_client (BlobClient) : blob client
+        '''
+        return self.get_container_client(container_name).get_blob_client(blob_name)
+
+    def _write(self, container_name, blob_name, data, content_type=None, metadata=None):
+        kwargs = {}
+        if content_type != None:
+            kwargs['content_settings'] = ContentSettings(content_type = content_type)
+        self.get_blob_client(container_name, blob_name).upload_blob(data, overwrite=True, metadata=metadata, **kwargs)
+
+    def read(self, container_name, blob_name):
+        return self.get_blob_client(container_name, blob_name).download_blob().readall()
+
+    def stream(self, container_name, blob_name):
+        return self.get_blob_client(container_name, blob_name).download_blob().chunks()
+
+    def get_metadata(self, container_name, blob_name):
+        try:
+            return self.get_blob_client(container_name, blob_name).get_blob_properties().metadata
+        except ResourceNotFoundError:
+            return None
+
+    def exists(self, container_name, blob_name):
+        return self.get_blob_client(container_name, blob_name).exists()
+
+    def list_blobs(self, container_name):
+        return [blob.name for blob in self.get_container_client(container_name).list_blobs()]
+
+    def read_versioned(self, container_name, blob_name):
+        try:
+            download = self.get_blob_client(container_name, blob_name).download_blob()
+            return (download.readall(), download.properties.etag)
+        except ResourceNotFoundError:
+            return (None, None)
+
+    def write_versioned(self, container_name, blob_name, data, etag):
+        blob_client = self.get_blob_client(container_name, blob_name)
+        try:
+            if etag == None:
+                response = blob_client.upload_blob(data, overwrite=False)
+            else:
+                response = blob_client.upload_blob(data, overwrite=True, etag=etag, match_condition=MatchConditions.IfNotModified)
+        except (ResourceExistsError, ResourceModifiedError):
+            return None
+        return response['etag']
+
+
+
+class LocalStorage(StorageSession):
+    '''Blob storage in a local directory, one subdirectory per container
+    Reads are memory-mapped, so blobs are served from the page cache without
+    buffering whole files; writes are atomic renames. Metadata is kept in a hidden
+    '.{name}.metadata' file next to the blob. Blob names containing '/' are kept in subdirectories.
+    '''
+
+    def __init__(self, path, workers=8):
+        '''Initialize LocalStorage object
+        Args:
+            path (str) : root directory
+            workers (int) : number of concurrent blob operations
+        Returns:
+            None
+        '''
+        super().__init__(workers)
+        self._path = path
+        self._version_lock = threading.Lock()
+
+    def get_path(self):
+        '''Return root directory'''
+        return self._path
+
+    def _file(self, container_name, blob_name):
+        '''Return file path of a blob'''
+        return os.path.join(self._path, container_name, blob_name)
+
+    def _metadata_file(self, container_name, blob_name):
+        '''Return file path of a blob's metadata'''
+        directory, name = os.path.split(self._file(container_name, blob_name))
+        return os.path.join(directory, f'.{name}.metadata')
+
+    def _replace(self, file, data):
+        '''Atomically replace file content'''
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        descriptor, temp = tempfile.mkstemp(dir=os.path.dirname(file), prefix='.tmp-')
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                f.write(data)
+            os.replace(temp, file)
+        except BaseException:
+            os.unlink(temp)
+            raise
+
+    def _write(self, container_name, blob_name, data, content_type=None, metadata=None):
+        if isinstance(data, str):
+            data = data.encode()
+        # Drop stale metadata first, a blob without metadata is always rewritten
+        try:
+            os.unlink(self._metadata_file(container_name, blob_name))
+        except FileNotFoundError:
+            pass
+        self._replace(self._file(container_name, blob_name), data)
+        if metadata:
+            self._replace(self._metadata_file(container_name, blob_name), json.dumps(metadata).encode())
+
+    def read(self, container_name, blob_name):
+        return b''.join(self.stream(container_name, blob_name))
+
+    def stream(self, container_name, blob_name):
+        # Open before returning so a missing blob raises here, like the Azure backend
+        f = open(self._file(container_name, blob_name), 'rb')
+        return self._chunks(f)
+
+    def _chunks(self, f):
+        '''Yield chunks of a memory-mapped file'''
+        with f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for start in range(0, len(mapped), CHUNK_SIZE):
+                    yield mapped[start:start + CHUNK_SIZE]
+
+    def get_metadata(self, container_name, blob_name):
+        if not os.path.isfile(self._file(container_name, blob_name)):
+            return None
+        try:
+            with open(self._metadata_file(container_name, blob_name), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def exists(self, container_name, blob_name):
+        return os.path.isfile(self._file(container_name, blob_name))
+
+    def list_blobs(self, container_name):
+        directory = os.path.join(self._path, container_name)
+        names = []
+        for root, directories, files in os.walk(directory):
+            directories[:] = [name for name in directories if not name.startswith('.')]
+            prefix = os.path.relpath(root, directory).replace(os.sep, '/')
+            for name in files:
+                if not name.startswith('.'):
+                    names.append(name if prefix == '.' else f'{prefix}/{name}')
+        return sorted(names)
+
+    def read_versioned(self, container_name, blob_name):
+        try:
+            data = self.read(container_name, blob_name)
+        except FileNotFoundError:
+            return (None, None)
+        return (data, content_hash(data))
+
+    def write_versioned(self, container_name, blob_name, data, etag):
+        # Serialized within the process, the content hash serves as ETag
+        with self._version_lock:
+            if self.read_versioned(container_name, blob_name)[1] != etag:
+                return None
+            self._write(container_name, blob_name, data)
+        return content_hash(data)
+
+
+
+class MemoryStorage(StorageSession):
+    '''Blob storage in process memory, for tests and benchmarks'''
+
+    def __init__(self, workers=8):
+        '''Initialize MemoryStorage object
+        Args:
+            workers (int) : number of concurrent blob operations
+        Returns:
+            None
+        '''
+        super().__init__(workers)
+        self._blobs = {}
+        self._metadata = {}
+
+    def _write(self, container_name, blob_name, data, content_type=None, metadata=None):
+        if isinstance(data, str):
+            data = data.encode()
+        with self._lock:
+            self._blobs[(container_name, blob_name)] = bytes(data)
+            self._metadata[(container_name, blob_name)] = dict(metadata or {})
+
+    def read(self, container_name, blob_name):
+        with self._lock:
+            return self._blobs[(container_name, blob_name)]
+
+    def stream(self, container_name, blob_name):
+        data = self.read(container_name, blob_name)
+        return (data[start:start + CHUNK_SIZE] for start in range(0, len(data), CHUNK_SIZE))
+
+    def get_metadata(self, container_name, blob_name):
+        with self._lock:
+            metadata = self._metadata.get((container_name, blob_name))
+        return dict(metadata) if metadata != None else None
+
+    def exists(self, container_name, blob_name):
+        with self._lock:
+            return (container_name, blob_name) in self._blobs
+
+    def list_blobs(self, container_name):
+        with self._lock:
+            return sorted(name for container, name in self._blobs.keys() if container == container_name)
+
+    def read_versioned(self, container_name, blob_name):
+        with self._lock:
+            data = self._blobs.get((container_name, blob_name))
+        if data == None:
+            return (None, None)
+        return (data, content_hash(data))
+
+    def write_versioned(self, container_name, blob_name, data, etag):
+        if isinstance(data, str):
+            data = data.encode()
+        with self._lock:
+            current = self._blobs.get((container_name, blob_name))
+            if (content_hash(current) if current != None else None) != etag:
+                return None
+            self._blobs[(container_name, blob_name)] = bytes(data)
+            self._metadata[(container_name, blob_name)] = {}
+        return content_hash(data)
+
+
+
+class Manifest:
+    '''Index of the blobs in a container, kept in a small manifest blob
+    Records name, content hash, size and update time of each blob written through
+    write_if_changed, so existence and change checks are a single point read of the
+    manifest instead of a container listing or a request per blob. Entries recorded during
+    a run are staged and committed together with a conditional write; on a conflicting
+    update the manifest is read again and the staged entries are re-applied.
+    '''
+
+    def __init__(self, blob_storage, container_name, blob_name=MANIFEST_BLOB):
+        '''Initialize Manifest object
+        Args:
+            blob_storage (StorageSession) : storage backend
+            container_name (str) : name of container
+            blob_name (str) : name of manifest blob
+        Returns:
+            None
+        '''
+        self._storage = blob_storage
+        self._container_name = container_name
+        self._blob_name = blob_name
+        self._entries = {}
+        self._staged = {}
+        self._etag = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        '''Read the manifest blob, an empty manifest if it does not exist yet, return self'''
+        data, etag = self._storage.read_versioned(self._container_name, self._blob_name)
+        entries = {}
+        if data != None:
+            try:
+                entries = json.loads(data.decode())['blobs']
+            except (ValueError, KeyError) as e:
+                logging.info(f'\n\nInvalid manifest, {self._container_name}/{self._blob_name}: {e}\n\n')
+        with self._lock:
+            self._entries = entries
+            self._etag = etag
+        return self
+
+    def get(self, name):
+        '''Return {'hash': hex digest, 'size': bytes, 'updated': ISO time} of a blob, None if not listed'''
+        with self._lock:
+            if name in self._staged:
+                return self._staged[name]
+            return self._entries.get(name)
+
+    def get_entries(self):
+        '''Return all entries, including staged changes'''
+        with self._lock:
+            entries = dict(self._entries)
+            for name, entry in self._staged.items():
+                if entry == None:
+                    entries.pop(name, None)
+                else:
+                    entries[name] = entry
+        return entries
+
+    def record(self, name, digest, size):
+        '''Stage the entry of a written blob
+        Args:
+            name (str) : blob name
+            digest (str) : content hash
+            size (int) : content size, bytes
+        Returns:
+            None
+        '''
+        with self._lock:
+            self._staged[name] = {'hash': digest, 'size': size,
+                                  'updated': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}
+
+    def discard(self, name):
+        '''Stage removal of a blob written without a known hash'''
+        with self._lock:
+            if name in self._entries or self._staged.get(name) != None:
+                self._staged[name] = None
+
+    def commit(self, attempts=5):
+        '''Write staged entries to the manifest blob
+        Args:
+            attempts (int) : conditional writes tried before giving up
+        Returns:
+            committed (bool) : True if the manifest is up to date
+        '''
+        for _ in range(attempts):
+            with self._lock:
+                if len(self._staged) == 0:
+                    return True
+                staged = dict(self._staged)
+                etag = self._etag
+            entries = self.get_entries()
+            data = json.dumps({'version': 1, 'blobs': entries}, sort_keys=True, indent=1)
+            new_etag = self._storage.write_versioned(self._container_name, self._blob_name, data, etag)
+            if new_etag != None:
+                with self._lock:
+                    self._entries = entries
+                    self._etag = new_etag
+                    # Entries staged again while committing stay staged
+                    for name, entry in staged.items():
+                        if self._staged.get(name, 0) == entry:
+                            del self._staged[name]
+                continue
+            # Another writer updated the manifest, read it again and re-apply staged entries
+            self.load()
+        logging.info(f'\n\nManifest update failed after {attempts} attempts: {self._container_name}/{self._blob_name}\n\n')
+        return False
@@ -0,0 +1,108 @@
+### Benchmark the fetch layer against test/mock_noaa.py, no requests reach api.weather.gov
+### Run in terminal: python3 -m test.bench_fetch --resorts 50 --latency 0.3 --workers 8 --rate 10 --burst 10 --error-rate 0.05
+
+import json
+import time
+import argparse
+import utils as utils
+import fetch_utils as fetch_utils
+import get_endpoints as get_endpoints
+import get_forecasts as get_forecasts
+from test.mock_noaa import MockNOAA, synthetic_locations
+
+PROPERTIES = ['temperature', 'windSpeed', 'windGust', 'probabilityOfPrecipitation', 'snowfallAmount',
+              'quantitativePrecipitation', 'snowLevel', 'skyCover', 'weather']
+
+def run_benchmark(args):
+    '''Resolve endpoints and fetch forecasts for synthetic resorts from a local mock server
+    Args:
+        args (Namespace) : parsed command line arguments
+    Returns:
+        report (dict) : wall time per phase, request counts and retry behaviour of each run
+    '''
+    mock = MockNOAA(args.fixtures, args.latency, args.jitter, args.error_rate, args.throttle_rate, args.server_rate, args.retry_after, args.seed)
+    url = mock.start()
+    locations = synthetic_locations(args.resorts, args.shared_cells, args.seed)
+    header = {'User-Agent': 'skiforecast benchmark, noreply@example.com'}
+    properties = PROPERTIES if args.properties else None
+    session = fetch_utils.NOAASession(header, args.workers)
+    report = {'resorts': args.resorts, 'endpoints': None, 'runs': []}
+
+    try:
+        # Endpoints are resolved once, as in production where they are cached between runs
+        limiter = fetch_utils.TokenBucket(args.rate, args.burst)
+        start = time.perf_counter()
+        cache = utils.APIEndpoints(locations, f'{url}/points/', header, 'forecastGridData', 'skiforecast', 'noaa_api_endpoints.json', limiter, args.workers, session)
+        endpoints = cache.get_endpoints()
+        report['endpoints'] = {'wall_time': round(time.perf_counter() - start, 3),
+                               'resolved': len(endpoints),
+                               'limiter_wait': round(limiter.get_waited(), 3)}
+        locations = {location: locations[location] for location in endpoints.keys()}
+        cells = len(set(get_endpoints.grid_cell(endpoint) for endpoint in endpoints.values()))
+
+        def refresh(location):
+            resolved = utils.APIEndpoints({location: locations[location]}, f'{url}/points/', header, 'forecastGridData',
+                                          'skiforecast', 'noaa_api_endpoints.json', limiter, 1, session).get_endpoints()
+            if location not in resolved:
+                return None
+            endpoints[location] = resolved[location]
+            return get_endpoints.endpoint_url(resolved[location])
+
+        # Later runs send conditional requests and should be answered with 304s
+        for run in range(args.runs):
+            before = mock.get_stats()
+            limiter = fetch_utils.TokenBucket(args.rate, args.burst)
+            policy = fetch_utils.RetryPolicy(args.max_attempts, args.base_delay, args.max_delay, args.budget, args.breaker_threshold, args.breaker_cooldown)
+            start = time.perf_counter()
+            forecasts = get_forecasts.fetch_forecasts(locations, endpoints, header, limiter, args.workers, session, policy, refresh, properties, args.compact)
+            wall_time = time.perf_counter() - start
+
+            after = mock.get_stats()
+            requests = {key: after[key] - before.get(key, 0) for key in after.keys() if after[key] != before.get(key, 0)}
+            succeeded = [location for location, forecast in forecasts.items() if forecast != None and forecast.get_status()[1] == False]
+            not_modified = [location for location in succeeded if forecasts[location].is_not_modified()]
+            sent = sum(count for key, count in requests.items() if key.startswith('gridpoints'))
+            report['runs'].append({'run': run + 1,
+                                   'wall_time': round(wall_time, 3),
+                                   'grid_cells': cells,
+                                   'succeeded': len(succeeded),
+                                   'not_modified': len(not_modified),
+                                   'failed': len(forecasts) - len(succeeded),
+                                   'requests': requests,
+                                   'rate_limit_floor': round(sent / args.rate, 3),
+                                   'limiter_wait': round(limiter.get_waited(), 3),
+                                   'retry_stats': policy.get_stats()})
+    finally:
+        mock.stop()
+
+    return report
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark NOAA API fetching against a local mock server')
+    parser.add_argument('--resorts', type=int, default=20, help='number of synthetic resorts')
+    parser.add_argument('--shared-cells', type=float, default=0.0, help='fraction of resorts sharing a grid cell')
+    parser.add_argument('--fixtures', default=None, help='directory of recorded *_points.json and *_gridData.json(.gz) responses')
+    parser.add_argument('--latency', type=float, default=0.2, help='server latency, seconds')
+    parser.add_argument('--jitter', type=float, default=0.1, help='random extra server latency, seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='probability of a 5xx response')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='probability of a 429 response')
+    parser.add_argument('--server-rate', type=float, default=0.0, help='server side rate limit, requests per second, 0 disables')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with 429 responses')
+    parser.add_argument('--workers', type=int, default=4, help='concurrent requests, FETCH_WORKERS')
+    parser.add_argument('--rate', type=float, default=4.0, help='client rate limit, NOAA_RATE_LIMIT')
+    parser.add_argument('--burst', type=float, default=4.0, help='client burst, NOAA_RATE_BURST')
+    parser.add_argument('--max-attempts', type=int, default=3)
+    parser.add_argument('--base-delay', type=float, default=0.5)
+    parser.add_argument('--max-delay', type=float, default=30)
+    parser.add_argument('--budget', type=float, default=60)
+    parser.add_argument('--breaker-threshold', type=int, default=5, help='consecutive server failures per forecast office that open the breaker')
+    parser.add_argument('--breaker-cooldown', type=float, default=300)
+    parser.add_argument('--runs', type=int, default=2, help='consecutive fetches, runs after the first are conditional')
+    parser.add_argument('--properties', action='store_true', help='stream decode configured properties only')
+    parser.add_argument('--compact', action='store_true', help='serialize forecasts in the compact format')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(json.dumps(run_benchmark(args), indent=4))
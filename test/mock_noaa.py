@@ -0,0 +1,340 @@
+### Local stand-in for api.weather.gov, used by test/bench_fetch.py
+### Run in terminal: python3 -m test.mock_noaa --port 8080 --latency 0.2 --error-rate 0.05
+
+import os
+import re
+import gzip
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Numeric gridData properties: {property: (uom, low, high)}
+NUMERIC_PROPERTIES = {
+    'temperature': ('wmoUnit:degC', -8, 6),
+    'dewpoint': ('wmoUnit:degC', -10, 2),
+    'maxTemperature': ('wmoUnit:degC', -5, 8),
+    'minTemperature': ('wmoUnit:degC', -12, 0),
+    'relativeHumidity': ('wmoUnit:percent', 50, 100),
+    'apparentTemperature': ('wmoUnit:degC', -15, 5),
+    'windChill': ('wmoUnit:degC', -20, 0),
+    'skyCover': ('wmoUnit:percent', 0, 100),
+    'windDirection': ('wmoUnit:degree_(angle)', 0, 359),
+    'windSpeed': ('wmoUnit:km_h-1', 0, 50),
+    'windGust': ('wmoUnit:km_h-1', 5, 80),
+    'probabilityOfPrecipitation': ('wmoUnit:percent', 0, 100),
+    'quantitativePrecipitation': ('wmoUnit:mm', 0, 6),
+    'iceAccumulation': ('wmoUnit:mm', 0, 0),
+    'snowfallAmount': ('wmoUnit:mm', 0, 40),
+    'snowLevel': ('wmoUnit:m', 300, 2000),
+    'ceilingHeight': ('wmoUnit:m', 0, 3000),
+    'visibility': ('wmoUnit:m', 100, 16000),
+    'transportWindSpeed': ('wmoUnit:km_h-1', 0, 60),
+    'transportWindDirection': ('wmoUnit:degree_(angle)', 0, 359),
+    'mixingHeight': ('wmoUnit:m', 100, 2000),
+    'twentyFootWindSpeed': ('wmoUnit:km_h-1', 0, 40),
+    'twentyFootWindDirection': ('wmoUnit:degree_(angle)', 0, 359),
+    'probabilityOfThunder': ('wmoUnit:percent', 0, 20),
+    'potentialOf15mphWinds': ('wmoUnit:percent', 0, 100),
+    }
+
+ACCUMULATIONS = ['quantitativePrecipitation', 'iceAccumulation', 'snowfallAmount']
+WEATHER = ['snow', 'snow_showers', 'rain', 'rain_showers', None]
+
+def synthetic_griddata(seed, start=None, hours=180):
+    '''Generate a forecastGridData response
+    Args:
+        seed (int) : random seed, same seed gives the same forecast
+        start (datetime) : first validTime, UTC; defaults to the current hour
+        hours (int) : hours covered
+    Returns:
+        data (dict) : gridData response
+    '''
+    rng = random.Random(seed)
+    if start == None:
+        start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+    def valid_time(hour, duration):
+        return (start + timedelta(hours=hour)).strftime('%Y-%m-%dT%H:%M:%S+00:00') + f'/PT{duration}H'
+
+    properties = {'@id': f'https://api.weather.gov/gridpoints/MCK/{seed},1',
+                  '@type': 'wx:Gridpoint',
+                  'updateTime': start.strftime('%Y-%m-%dT%H:%M:%S+00:00'),
+                  'validTimes': start.strftime('%Y-%m-%dT%H:%M:%S+00:00') + f'/PT{hours}H',
+                  'elevation': {'unitCode': 'wmoUnit:m', 'value': round(rng.uniform(900, 1800), 2)},
+                  'forecastOffice': 'https://api.weather.gov/offices/MCK',
+                  'gridId': 'MCK', 'gridX': seed, 'gridY': 1}
+
+    for property, (uom, low, high) in NUMERIC_PROPERTIES.items():
+        values = []
+        hour = 0
+        while hour < hours:
+            duration = 6 if property in ACCUMULATIONS else rng.choice([1, 1, 2, 3, 6])
+            values.append({'validTime': valid_time(hour, duration), 'value': round(rng.uniform(low, high), 2)})
+            hour += duration
+        properties[property] = {'uom': uom, 'values': values}
+
+    values = []
+    hour = 0
+    while hour < hours:
+        duration = rng.choice([3, 6, 12])
+        weather = rng.choice(WEATHER)
+        value = {'coverage': None, 'weather': None, 'intensity': None, 'visibility': {'unitCode': 'wmoUnit:km', 'value': None}, 'attributes': []}
+        if weather != None:
+            value.update({'coverage': rng.choice(['chance', 'likely']), 'weather': weather, 'intensity': 'light'})
+        values.append({'validTime': valid_time(hour, duration), 'value': [value]})
+        hour += duration
+    properties['weather'] = {'values': values}
+    properties['hazards'] = {'values': []}
+
+    return {'@context': ['https://geojson.org/geojson-ld/geojson-context.jsonld', {'@version': '1.1'}],
+            'id': properties['@id'],
+            'type': 'Feature',
+            'geometry': {'type': 'Polygon', 'coordinates': [[[-121.1, 47.7], [-121.1, 47.8], [-121.0, 47.8], [-121.1, 47.7]]]},
+            'properties': properties}
+
+def load_fixture(path):
+    '''Return the content of a fixture file
+    Args:
+        path (str) : raw response or forecast blob, '.json' or gzip compressed '.json.gz',
+                     e.g., '{location}_gridData.json.gz' as written by the pipeline
+    Returns:
+        data (dict) : decoded content
+    '''
+    with open(path, 'rb') as f:
+        content = f.read()
+    if path.endswith('.gz'):
+        content = gzip.decompress(content)
+    return json.loads(content.decode())
+
+def grid_cell_key(fixture):
+    '''Return (office, x, y) of a recorded gridData response or forecast blob, None if unknown
+    Blobs trimmed to the configured properties keep the grid cell as 'grid_cell', e.g., 'SEW/163,65'.
+    '''
+    match = re.match(r'^(\w+)/(\d+),(\d+)$', str(fixture.get('grid_cell')))
+    if match != None:
+        return (match.group(1), int(match.group(2)), int(match.group(3)))
+    properties = fixture.get('data', fixture).get('properties', {})
+    if None not in (properties.get('gridId'), properties.get('gridX'), properties.get('gridY')):
+        return (properties['gridId'], properties['gridX'], properties['gridY'])
+    return None
+
+def point_key(data):
+    '''Return (lat, long) of a recorded /points response, None if it does not name its point'''
+    match = re.search(r'/points/(-?[\d.]+),(-?[\d.]+)$', data.get('id', data.get('properties', {}).get('@id', '')))
+    if match != None:
+        return (round(float(match.group(1)), 4), round(float(match.group(2)), 4))
+    coordinates = data.get('geometry', {}).get('coordinates')
+    if coordinates != None:
+        return (round(coordinates[1], 4), round(coordinates[0], 4))
+    return None
+
+def synthetic_locations(count, shared_cells=0.0, seed=0):
+    '''Generate LOCATIONS for count synthetic resorts
+    Args:
+        count (int) : number of resorts
+        shared_cells (float) : fraction of resorts placed in the grid cell of another resort
+        seed (int) : random seed
+    Returns:
+        locations (dict) : {location name: [[lat, long], [base elev., summit elev.], [ski area url]]}
+    '''
+    rng = random.Random(seed)
+    locations = {}
+    for i in range(count):
+        lat_long = [round(46.0 + 0.01 * i, 4), -121.0]
+        if i > 0 and rng.random() < shared_cells:
+            lat_long = list(rng.choice(list(locations.values()))[0])
+        locations[f'Resort {i:03d}'] = [lat_long, [3000 + 10 * i, 5000 + 10 * i], [f'https://example.com/resort{i}']]
+    return locations
+
+
+
+class MockNOAA:
+    '''Local NOAA API stand-in serving /points and /gridpoints with latency and fault injection'''
+
+    def __init__(self, fixtures=None, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0, rate_limit=0.0, retry_after=1, seed=0):
+        '''Initialize MockNOAA object
+        Args:
+            fixtures (str) : directory of recorded responses, '*_points.json' /points responses and
+                             '{location}_gridData.json' or compact '{location}_gridData.json.gz' blobs or raw
+                             gridData responses; synthetic responses are served if None or not recorded
+            latency (float) : seconds added to every response
+            jitter (float) : random extra latency, seconds
+            error_rate (float) : probability of a 5xx response
+            throttle_rate (float) : probability of a 429 response
+            rate_limit (float) : requests per second accepted before answering 429, 0 disables
+            retry_after (int) : Retry-After seconds sent with 429 responses
+            seed (int) : random seed
+        Returns:
+            None
+        '''
+        self._latency = latency
+        self._jitter = jitter
+        self._error_rate = error_rate
+        self._throttle_rate = throttle_rate
+        self._rate_limit = rate_limit
+        self._retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._allowance = rate_limit
+        self._checked = time.monotonic()
+        self._fixtures = []
+        self._cells = {}    # Recorded gridData by (office, x, y)
+        self._points = {}   # Recorded /points responses by (lat, long)
+        self._bodies = {}
+        self._stats = {}
+        self._server = None
+
+        if fixtures != None:
+            for file in sorted(os.listdir(fixtures)):
+                if file.endswith('_points.json'):
+                    data = load_fixture(os.path.join(fixtures, file))
+                    key = point_key(data)
+                    if key != None:
+                        self._points[key] = data
+                elif file.endswith('_gridData.json') or file.endswith('_gridData.json.gz'):
+                    fixture = load_fixture(os.path.join(fixtures, file))
+                    data = fixture.get('data', fixture)
+                    self._fixtures.append(data)
+                    key = grid_cell_key(fixture)
+                    if key != None:
+                        self._cells[key] = data
+
+    def start(self, port=0):
+        '''Start serving in a background thread, return base url'''
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                mock._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.get_url()
+
+    def stop(self):
+        '''Stop serving'''
+        if self._server != None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def get_url(self):
+        '''Return base url, use as NOAA_API_URL'''
+        return f'http://127.0.0.1:{self._server.server_port}'
+
+    def get_stats(self):
+        '''Return request counts, {'points 200': n, 'gridpoints 304': n, ...}'''
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, kind, status):
+        with self._lock:
+            key = f'{kind} {status}'
+            self._stats[key] = self._stats.get(key, 0) + 1
+
+    def _rate_limited(self):
+        '''Server side token bucket'''
+        if self._rate_limit <= 0:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(max(self._rate_limit, 1), self._allowance + (now - self._checked) * self._rate_limit)
+            self._checked = now
+            if self._allowance < 1:
+                return True
+            self._allowance -= 1
+            return False
+
+    def _gridpoint(self, office, x, y):
+        '''Return gridData response body and ETag for a grid cell'''
+        key = (office, x, y)
+        with self._lock:
+            cached = self._bodies.get(key)
+        if cached != None:
+            return cached
+        if key in self._cells:
+            data = self._cells[key]
+        elif len(self._fixtures) > 0:
+            data = self._fixtures[x % len(self._fixtures)]
+        else:
+            data = synthetic_griddata(x)
+        body = json.dumps(data).encode()
+        cached = (body, '"' + hashlib.sha1(body).hexdigest() + '"')
+        with self._lock:
+            self._bodies[key] = cached
+        return cached
+
+    def _send(self, handler, kind, status, body=b'', headers=None):
+        self._count(kind, status)
+        handler.send_response(status)
+        for key, value in (headers or {}).items():
+            handler.send_header(key, value)
+        handler.send_header('Content-Type', 'application/geo+json')
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        if len(body) > 0:
+            handler.wfile.write(body)
+
+    def _handle(self, handler):
+        points = re.match(r'^/points/(-?[\d.]+),(-?[\d.]+)$', handler.path)
+        gridpoints = re.match(r'^/gridpoints/(\w+)/(\d+),(\d+)$', handler.path)
+        kind = 'points' if points else 'gridpoints' if gridpoints else 'other'
+
+        time.sleep(self._latency + self._rng.random() * self._jitter)
+
+        if kind == 'other':
+            return self._send(handler, kind, 404)
+        if self._rate_limited() or self._rng.random() < self._throttle_rate:
+            return self._send(handler, kind, 429, headers={'Retry-After': str(self._retry_after)})
+        if self._rng.random() < self._error_rate:
+            return self._send(handler, kind, self._rng.choice([500, 502, 503]))
+
+        if points:
+            lat = float(points.group(1))
+            recorded = self._points.get((round(lat, 4), round(float(points.group(2)), 4)))
+            if recorded != None:
+                # Replay the recorded response, its API urls point to this server
+                body = json.dumps(recorded).replace('https://api.weather.gov', self.get_url()).encode()
+                return self._send(handler, kind, 200, body)
+            x = int(round((lat - 40) * 100))
+            body = json.dumps({'properties': {'gridId': 'MCK', 'gridX': x, 'gridY': 1,
+                                              'forecastGridData': f'{self.get_url()}/gridpoints/MCK/{x},1',
+                                              'forecastZone': f'{self.get_url()}/zones/forecast/WAZ568'}}).encode()
+            return self._send(handler, kind, 200, body)
+
+        body, etag = self._gridpoint(gridpoints.group(1), int(gridpoints.group(2)), int(gridpoints.group(3)))
+        if handler.headers.get('If-None-Match') == etag:
+            return self._send(handler, kind, 304, headers={'ETag': etag})
+        return self._send(handler, kind, 200, body, {'ETag': etag})
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a local NOAA API stand-in')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--fixtures', default=None, help='directory of recorded *_points.json and *_gridData.json(.gz) responses')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float, default=0.0)
+    args = parser.parse_args()
+
+    mock = MockNOAA(args.fixtures, args.latency, args.jitter, args.error_rate, args.throttle_rate, args.rate_limit)
+    print(f'NOAA_API_URL={mock.start(args.port)}')
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        print(json.dumps(mock.get_stats(), indent=4))
+        mock.stop()
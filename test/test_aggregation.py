@@ -0,0 +1,62 @@
+### Run in terminal: python3 -m pytest test/test_aggregation.py
+
+import math
+from array import array
+from datetime import datetime, timezone
+import utils as utils
+import aggregation as aggregation
+import calculations as calculations
+from test.mock_noaa import synthetic_griddata
+
+TIME_PERIODS = {'day0': ['24h', 'am', 'pm', 'overnight'], 'day1': ['24h'], 'day6': ['24h']}
+PROPERTIES = {'temperature': {'units': 'degF', 'calculations': ['max', 'min', 'avg']},
+              'snowfallAmount': {'units': 'in', 'calculations': ['sum']},
+              'snowLevel': {'units': 'ft', 'calculations': ['min', 'max']}}
+
+def test_buckets_skip_missing_hours():
+    values = array('d', [9.0, 1.0, math.nan, 4.0, 1.0, 4.0, 7.0])
+    partials = [aggregation.reduce_bucket(values, 1, 4, True), aggregation.reduce_bucket(values, 4, 6, True)]
+    assert partials == [(2, 5.0, 3, 4.0, 1, 1.0), (2, 5.0, 5, 4.0, 4, 1.0)]
+    steps = [calculations.REDUCERS[name] for name in ('max', 'min', 'avg', 'sum')]
+    result = aggregation.combine_buckets(partials, steps, lambda index: 100 + index)
+    assert result == {'count': 4, 'max': (103, 4.0), 'min': (101, 1.0), 'avg': 2.5, 'sum': 10.0}
+    assert aggregation.combine_buckets([aggregation.reduce_bucket(values, 2, 3, True)], steps[:1], None) == {'count': 0}
+
+def test_period_index_visits_hours_once():
+    now = datetime(2024, 2, 24, 13, tzinfo=timezone.utc)
+    index = aggregation.get_period_index(now, {'day0': ['24h', 'am', 'pm', 'overnight'], 'day1': ['pm']})
+    buckets = index.get_buckets()
+    assert [len(bucket) for bucket in buckets] == [6, 6, 12, 6, 6, 12]
+    assert index.get_segments()[('day0', '24h')] == [0, 1, 2]
+    assert index.get_segments()[('day0', 'overnight')] == [2]
+    assert index.get_segments()[('day1', '24h')] == [3, 4, 5]
+    assert index.get_segments()[('day1', 'pm')] == [4]
+
+def test_batch_matches_single_location():
+    now = datetime(2024, 2, 24, 13, tzinfo=timezone.utc)
+    start = datetime(2024, 2, 24, 11, tzinfo=timezone.utc)
+    forecasts = {}
+    for seed in range(3):
+        blob_data = {'lat_long': [47.7, -121.1], 'elev': [4061, 5845], 'href': [''], 'data': synthetic_griddata(seed, start)}
+        forecasts[f'Resort {seed}'] = utils.TableData(now, f'Resort {seed}', TIME_PERIODS, PROPERTIES).parse_forecast(blob_data)
+
+    batch = aggregation.aggregate_forecasts(now, TIME_PERIODS, PROPERTIES, forecasts)
+    for location, forecast in forecasts.items():
+        assert batch[location] == aggregation.aggregate_forecasts(now, TIME_PERIODS, PROPERTIES, {location: forecast})[location]
+
+    day = batch['Resort 1']['temperature']
+    assert set(day.keys()) == {('day0', '24h'), ('day0', 'am'), ('day0', 'pm'), ('day0', 'overnight'), ('day1', '24h'), ('day6', '24h')}
+    assert day[('day0', '24h')]['count'] == 24
+    assert day[('day0', 'am')]['count'] + day[('day0', 'pm')]['count'] + day[('day0', 'overnight')]['count'] == 24
+    assert day[('day0', '24h')]['max'][1] == max(day[('day0', period)]['max'][1] for period in ['am', 'pm', 'overnight'])
+
+def test_empty_period_keeps_other_properties():
+    # A forecast starting at 13:00 Pacific has no values in the am period of day0
+    now = datetime(2024, 2, 24, 21, tzinfo=timezone.utc)
+    start = datetime(2024, 2, 24, 21, tzinfo=timezone.utc)
+    blob_data = {'lat_long': [47.7, -121.1], 'elev': [4061, 5845], 'href': [''], 'data': synthetic_griddata(0, start)}
+    setup = utils.TableData(now, 'Resort 0', TIME_PERIODS, PROPERTIES)
+    periods = setup.calculate_table_data(setup.parse_forecast(blob_data)).days['day0'].periods
+    assert periods['am'].data['temperature'].data == {}
+    assert set(periods['am'].data.keys()) == set(periods['pm'].data.keys())
+    assert 'max' in periods['pm'].data['temperature'].data
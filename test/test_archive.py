@@ -0,0 +1,44 @@
+### Run in terminal: python3 -m pytest test/test_archive.py
+
+from datetime import datetime, timedelta, timezone
+import archive as archive
+import storage as storage
+from test.mock_noaa import synthetic_griddata
+
+def forecast(issued, seed):
+    return {'lat_long': [47.7439, -121.0908], 'elev': [4061, 5845], 'grid_cell': 'SEW/150,50',
+            'data': synthetic_griddata(seed, issued, hours=72)}
+
+def test_parse_valid_time():
+    assert archive.parse_valid_time('2024-02-24T11:00:00+00:00/PT2H') == (1708772400, 7200)
+    assert archive.parse_valid_time('2024-02-24T11:00:00+00:00/P1DT6H') == (1708772400, 30 * 3600)
+
+def test_as_of_returns_forecast_issued_before_time():
+    session = storage.MemoryStorage()
+    history = archive.Archive(session)
+    issues = [datetime(2024, 1, 30, 12, tzinfo=timezone.utc) + timedelta(days=day) for day in range(5)]
+    for seed, issued in enumerate(issues):
+        assert history.append('Stevens Pass', forecast(issued, seed)) != None
+    assert history.append('Stevens Pass', forecast(issues[0], 0)) == None
+
+    # A fresh archive answers with the partition list, one monthly index and one snapshot
+    reads = []
+    read_versioned = session.read_versioned
+    session.read_versioned = lambda *args: reads.append(args[1]) or read_versioned(*args)
+    history = archive.Archive(session)
+    tuesday = datetime(2024, 2, 1, 18, tzinfo=timezone.utc)
+    saturday = datetime(2024, 2, 3, 8, tzinfo=timezone.utc)
+    values = history.get_values('Stevens Pass', 'snowfallAmount', saturday, saturday + timedelta(hours=12), tuesday)
+    assert values['issued'] == archive.to_epoch(issues[2])
+    assert reads == ['archive/Stevens Pass/partitions.json', 'archive/Stevens Pass/2024-02/index.json']
+
+    expected = synthetic_griddata(2, issues[2], hours=72)['properties']['snowfallAmount']['values']
+    expected = [archive.parse_valid_time(value['validTime']) + (value['value'],) for value in expected]
+    expected = [value for value in expected
+                if value[0] < archive.to_epoch(saturday) + 12 * 3600 and value[0] + value[1] > archive.to_epoch(saturday)]
+    assert values['values'] == expected and len(expected) > 0
+
+    # Earlier partitions are read only when the month has no earlier issue
+    assert history.as_of('Stevens Pass', datetime(2024, 2, 1, 6, tzinfo=timezone.utc))['issued'] == archive.to_epoch(issues[1])
+    assert history.as_of('Stevens Pass', datetime(2024, 1, 1, tzinfo=timezone.utc)) == None
+    assert history.get_issues('Stevens Pass', start=issues[1], end=issues[3]) == [archive.to_epoch(issue) for issue in issues[1:4]]
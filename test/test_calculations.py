@@ -0,0 +1,29 @@
+### Run in terminal: python3 -m pytest test/test_calculations.py
+
+import math
+from array import array
+import aggregation as aggregation
+import calculations as calculations
+
+PROPERTIES = {'temperature': {'units': 'degF', 'calculations': ['max', 'p90', 'hours_above_35', 'hours_below_32', 'hours']},
+              'weather': {'units': None, 'calculations': ['extr_str']}}
+
+def test_plan_resolves_calculations():
+    plan = calculations.get_plan(PROPERTIES)
+    assert plan is calculations.get_plan(dict(PROPERTIES))
+    assert [step.name for step in plan.get_steps('temperature')] == PROPERTIES['temperature']['calculations']
+    assert plan.needs_extremes('temperature') and plan.needs_values('temperature')
+    assert plan.get_steps('weather') == []
+    assert calculations.resolve('p999', 'temperature', PROPERTIES['temperature']) == None
+
+def test_parameterized_reducers():
+    # degC hourly values, thresholds are in the configured degF
+    values = array('d', [-5.0, 0.0, math.nan, 1.0, 2.0, 3.0, 10.0])
+    steps = calculations.get_plan(PROPERTIES).get_steps('temperature')
+    partials = [aggregation.reduce_bucket(values, 0, 4, True, True), aggregation.reduce_bucket(values, 4, 7, True, True)]
+    result = aggregation.combine_buckets(partials, steps, lambda index: index, 'degC')
+    assert result['max'] == (6, 10.0)
+    assert math.isclose(result['p90'], 6.5)
+    assert result['hours_above_35'] == 3
+    assert result['hours_below_32'] == 1
+    assert result['hours'] == 6
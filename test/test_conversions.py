@@ -0,0 +1,28 @@
+### Run in terminal: python3 -m pytest test/test_conversions.py
+
+import math
+import utils as utils
+import calculations as calculations
+import conversions as conversions
+
+def test_bin_edges():
+    assert conversions.convert(348.75, 'windDirection', 'degree_(angle)') == ('cardinal', 'N')
+    assert conversions.convert(11.25, 'windDirection', 'degree_(angle)') == ('cardinal', 'NNE')
+    assert conversions.convert_array([10, 10.5, 30, 50, 50.5, 70, 71], 'probabilityOfPrecipitation', 'percent')[1] == \
+        ['unlikely', 'slight chance', 'chance', 'chance', 'likely', 'likely', 'very likely']
+    assert conversions.convert_array([5.9, 6, 88, math.nan], 'skyCover', 'percent')[1] == ['Clear', 'Mostly Clear', 'Overcast', None]
+    assert utils.convert_units('Partly Cloudy', 'skyCover', 'condition') == ('percent', 49)
+
+def test_convert_array():
+    units, values = conversions.convert_array([0.0, math.nan, 100.0], 'temperature', 'degC')
+    assert units == 'degF' and values[0] == 32 and math.isnan(values[1]) and values[2] == 212
+    assert conversions.convert(-40, 'temperature', 'degF') == ('degC', -40)
+
+def test_convert_results():
+    steps = calculations.get_plan({'snowLevel': {'units': 'ft', 'calculations': ['min', 'avg', 'hours']}}).get_steps('snowLevel')
+    results = {('day0', '24h'): {'count': 2, 'min': (100, 1000.0), 'avg': 1500.0, 'hours': 2}, ('day1', '24h'): {'count': 0}}
+    units, converted = conversions.convert_results(results, steps, 'snowLevel', 'm')
+    assert units == 'ft'
+    assert converted[('day0', '24h')] == {'count': 2, 'min': (100, 1000.0 * 3.28084), 'avg': 1500.0 * 3.28084, 'hours': 2}
+    assert converted[('day1', '24h')] == {'count': 0}
+    assert results[('day0', '24h')]['avg'] == 1500.0
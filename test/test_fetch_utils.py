@@ -0,0 +1,115 @@
+### Run in terminal: python3 -m pytest test/test_fetch_utils.py
+
+import time
+import threading
+import fetch_utils as fetch_utils
+
+def test_token_bucket_burst_is_immediate():
+    bucket = fetch_utils.TokenBucket(rate=1, capacity=3)
+    start = time.monotonic()
+    for _ in range(3):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.05
+
+def test_token_bucket_enforces_rate_across_threads():
+    bucket = fetch_utils.TokenBucket(rate=50, capacity=1)
+    stamps = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(5):
+            bucket.acquire()
+            with lock:
+                stamps.append(time.monotonic())
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # 20 requests at 50/s with a burst of 1 take at least 19 intervals
+    assert len(stamps) == 20
+    assert time.monotonic() - start >= 19 / 50 * 0.9
+
+def test_token_bucket_unlimited():
+    bucket = fetch_utils.TokenBucket(rate=0)
+    assert bucket.acquire() == 0.0
+
+def test_session_sends_conditional_get():
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.headers.get('If-None-Match') == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = b'{"properties": {}}'
+            self.send_response(200)
+            self.send_header('ETag', '"v1"')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/gridpoints/SEW/1,1'
+    try:
+        session = fetch_utils.NOAASession({'User-Agent': 'test'})
+        assert session.get(url, conditional=True).status_code == 200
+        assert session.get_validators() == {url: {'etag': '"v1"', 'last_modified': None}}
+        assert session.get(url, conditional=True).status_code == 304
+
+        # Validators persisted by a previous run are honoured by a new session
+        restored = fetch_utils.NOAASession({'User-Agent': 'test'})
+        restored.set_validators(session.get_validators())
+        assert restored.get(url, conditional=True).status_code == 304
+    finally:
+        server.shutdown()
+
+def test_retry_policy_retries_transient_then_succeeds():
+    sleeps = []
+    policy = fetch_utils.RetryPolicy(max_attempts=3, base_delay=1, sleep=sleeps.append)
+    responses = iter([('a', 503, True, None), ('b', 429, True, 2.0), ('c', 200, False, None)])
+    assert policy.call('api/SEW', lambda: next(responses)) == 'c'
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= 1
+    assert sleeps[1] == 2.0    # Retry-After is honoured
+    assert policy.get_stats()['retries'] == 2
+
+def test_retry_policy_refreshes_stale_endpoint_and_stops_on_fatal():
+    refreshed = []
+    policy = fetch_utils.RetryPolicy(sleep=lambda delay: None)
+    responses = iter([(1, 404, True, None), (2, 403, True, None), (3, 200, False, None)])
+    assert policy.call('api/SEW', lambda: next(responses), lambda: refreshed.append(True)) == 2
+    assert refreshed == [True]
+
+def test_retry_policy_budget_and_breaker():
+    policy = fetch_utils.RetryPolicy(max_attempts=5, budget=2.5, breaker_threshold=3, breaker_cooldown=60, sleep=lambda delay: None)
+    calls = []
+
+    def failing():
+        calls.append(True)
+        return (None, 500, True, 1.0)
+
+    # Budget allows two 1s waits, the third wait is refused
+    assert policy.call('api/SEW', failing) == None
+    assert len(calls) == 3
+    assert policy.get_stats()['budget_exhausted'] == 1
+
+    # Three consecutive server failures opened the breaker, further requests are skipped
+    assert policy.allow('api/SEW') == False
+    assert policy.call('api/SEW', failing) == None
+    assert len(calls) == 3
+    assert policy.allow('api/PDT') == True
+
+def test_parse_retry_after():
+    assert fetch_utils.parse_retry_after('5') == 5.0
+    assert fetch_utils.parse_retry_after(None) == None
+    assert fetch_utils.parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    assert fetch_utils.breaker_key('https://api.weather.gov/gridpoints/SEW/150,50') == 'api.weather.gov/gridpoints/SEW'
@@ -0,0 +1,62 @@
+### Run in terminal: python3 -m pytest test/test_forecast_grid.py
+
+import math
+from datetime import datetime, timezone
+import utils as utils
+import forecast_grid as forecast_grid
+import forecast_model as forecast_model
+
+START = int(datetime(2024, 2, 24, 14, tzinfo=timezone.utc).timestamp())   # 6am PST
+
+def test_expand_splits_accumulations():
+    grid = forecast_grid.HourlyGrid(START, 12)
+    intervals = [(START - 3600, 6 * 3600, 6.0), (START + 5 * 3600, 2 * 3600, None), (START + 9 * 3600, 6 * 3600, 12.0)]
+    values = grid.expand(intervals, accumulate=True)
+    assert list(values[:5]) == [1.0] * 5
+    assert all(math.isnan(value) for value in values[5:9])
+    assert list(values[9:]) == [2.0] * 3
+
+    values = grid.expand([(START, 3 * 3600, -4.0), (START + 3 * 3600, 3600, -2.0)])
+    assert list(values[:4]) == [-4.0, -4.0, -4.0, -2.0]
+    assert math.isnan(values[4])
+
+def test_expand_codes():
+    grid = forecast_grid.HourlyGrid(START, 4)
+    snow = forecast_model.intern_weather([('snow', 'light', 'likely')])
+    assert snow == forecast_model.intern_weather([['snow', 'light', 'likely']])
+    assert forecast_model.get_weather(snow) == (('snow', 'light', 'likely'),)
+    assert list(grid.expand_codes([(START + 3600, 2 * 3600, snow)])) == [0, snow, snow, 0]
+    # Intervals outside the grid leave it unchanged
+    assert list(grid.expand_codes([(START - 3 * 3600, 2 * 3600, snow), (START + 5 * 3600, 3600, snow)])) == [0, 0, 0, 0]
+
+def test_weather_is_interned_per_run():
+    forecast_model.intern_weather([('snow', 'light', 'likely')])
+    forecast_model.reset_weather()
+    rain = forecast_model.intern_weather([('rain', 'light', 'likely')])
+    assert rain == 1 and forecast_model.get_weather(rain) == (('rain', 'light', 'likely'),)
+
+def test_parse_forecast_is_time_weighted():
+    # A 6 hour value crossing noon counts in the am and pm periods, amounts are split by hour
+    now = datetime(2024, 2, 24, 13, tzinfo=timezone.utc)
+    blob_data = {'lat_long': [47.7, -121.1], 'elev': [4061, 5845], 'href': [''],
+                 'data': {'properties': {
+                     'temperature': {'uom': 'wmoUnit:degC', 'values': [
+                         {'validTime': '2024-02-24T14:00:00+00:00/PT1H', 'value': 0.0},
+                         {'validTime': '2024-02-24T15:00:00+00:00/PT6H', 'value': 6.0}]},
+                     'snowfallAmount': {'uom': 'wmoUnit:mm', 'values': [
+                         {'validTime': '2024-02-24T17:00:00+00:00/PT6H', 'value': 30.0}]}}}}
+    properties = {'temperature': {'units': 'degC', 'calculations': ['max', 'min', 'avg']},
+                  'snowfallAmount': {'units': 'mm', 'calculations': ['sum']}}
+    setup = utils.TableData(now, 'Stevens Pass', {'day0': ['24h', 'am', 'pm']}, properties)
+    parsed = setup.parse_forecast(blob_data)
+    temperature = parsed.predictions['temperature'].values
+    assert temperature.typecode == 'd'
+    assert list(temperature[:7]) == [0.0] + [6.0] * 6 and math.isnan(temperature[7])
+    snowfall = parsed.predictions['snowfallAmount'].values
+    assert list(snowfall[3:9]) == [5.0] * 6
+
+    results = setup.calculate_table_data(parsed).days['day0'].periods
+    assert math.isclose(results['24h'].data['temperature'].data['avg'], 36 / 7)
+    assert results['pm'].data['temperature'].data['avg'] == 6.0
+    assert results['am'].data['snowfallAmount'].data['sum'] == 15.0
+    assert results['pm'].data['snowfallAmount'].data['sum'] == 15.0
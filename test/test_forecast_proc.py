@@ -2,6 +2,8 @@
 
 import os
 import json
+import dataclasses
+from array import array
 from datetime import datetime, time
 import pytz
 import bs4 as BeautifulSoup
@@ -15,6 +17,12 @@ simulated_time = datetime.combine(now, process_time)
 simulated_time = tz.localize(simulated_time)
 local_time = simulated_time.astimezone(pytz.timezone('US/Pacific'))
 
+# Save hourly value arrays as lists and dates as strings
+def json_default(value):
+    if isinstance(value, array):
+        return value.tolist()
+    return str(value)
+
 # Define parameters
 locations = {
     "Mt. Baker": [[48.8618, -121.6789], [3500, 5000], ["https://www.mtbaker.us/snow-report/"]], 
@@ -116,7 +124,7 @@ for file in files.keys():
 
     # Save parsed forecast data as json
     with open(f"{path}{file}_parsed.json", 'w') as f:
-        print(json.dumps(parsed, sort_keys=False, indent=4), file = f)
+        print(json.dumps(dataclasses.asdict(parsed), sort_keys=False, indent=4, default=json_default), file = f)
         print(f'PARSED DATA SAVED AS: {path}{file}_parsed.json\n')
     f.close()
 
@@ -129,7 +137,7 @@ for file in files.keys():
 
     # Save table data as json
     with open(f'{path}{file}_table_data.json', 'w') as f:
-        print(json.dumps(table_data, sort_keys=False, indent=4), file = f)
+        print(json.dumps(dataclasses.asdict(table_data), sort_keys=False, indent=4, default=json_default), file = f)
         print(f'TABLE DATA SAVED AS: {path}{file}_table_data.json\n')
     f.close()
 
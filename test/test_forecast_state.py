@@ -0,0 +1,61 @@
+### Run in terminal: python3 -m pytest test/test_forecast_state.py
+
+import json
+from datetime import datetime, timezone
+import utils as utils
+import aggregation as aggregation
+import forecast_state as forecast_state
+from test.mock_noaa import synthetic_griddata
+
+TIME_PERIODS = {'day0': ['24h', 'am', 'pm', 'overnight'], 'day1': ['24h', 'am', 'pm', 'overnight'], 'day2': ['24h'],
+                'day3': ['24h'], 'day4': ['24h'], 'day5': ['24h'], 'day6': ['24h']}
+PROPERTIES = {'temperature': {'units': 'degF', 'calculations': ['max', 'min', 'avg']},
+              'snowfallAmount': {'units': 'in', 'calculations': ['sum']},
+              'weather': {'units': 'text', 'calculations': ['extr_str']}}
+START = datetime(2024, 2, 24, 11, tzinfo=timezone.utc)
+
+def run(now, saved, forecasts):
+    state = forecast_state.ForecastState(now, TIME_PERIODS, saved)
+    for location, parsed in forecasts.items():
+        state.compare(location, forecast_state.config_key(PROPERTIES), parsed, 'update')
+    aggregates = aggregation.aggregate_forecasts(now, TIME_PERIODS, PROPERTIES, forecasts, state.get_slices())
+    state.merge(aggregates)
+    return state, aggregates
+
+def parse(now, seed):
+    blob_data = {'lat_long': [47.7, -121.1], 'elev': [4061, 5845], 'href': [''], 'data': synthetic_griddata(seed, START)}
+    return utils.TableData(now, f'Resort {seed}', TIME_PERIODS, PROPERTIES).parse_forecast(blob_data)
+
+def test_next_day_reuses_unchanged_slices():
+    now = datetime(2024, 2, 24, 13, tzinfo=timezone.utc)
+    state, aggregates = run(now, None, {'Resort 0': parse(now, 0)})
+    assert state.get_slices()['Resort 0']['temperature'] == list(TIME_PERIODS.keys())
+
+    # Same forecast the next day, day1 and day2 become day0 and day1
+    now = datetime(2024, 2, 25, 15, tzinfo=timezone.utc)
+    forecasts = {'Resort 0': parse(now, 0)}
+    state, aggregates = run(now, json.loads(state.dumps()), forecasts)
+    assert state.get_slices()['Resort 0']['temperature'] == ['day1', 'day6']
+    assert aggregates == aggregation.aggregate_forecasts(now, TIME_PERIODS, PROPERTIES, forecasts)
+
+    # Rerun with the same forecast, cells of days keeping their name are reused
+    state, aggregates = run(now, json.loads(state.dumps()), forecasts)
+    assert state.get_slices()['Resort 0'] == {}
+    table_data = utils.TableData(now, 'Resort 0', TIME_PERIODS, PROPERTIES).calculate_table_data(forecasts['Resort 0'], aggregates['Resort 0'])
+    state.set_row('Resort 0', utils.TableData(now, 'Resort 0', TIME_PERIODS, PROPERTIES).create_row(table_data))
+    state, aggregates = run(now, json.loads(state.dumps()), forecasts)
+    assert sorted(state.get_cells('Resort 0').keys()) == list(TIME_PERIODS.keys())
+
+def test_cells_keep_their_format():
+    # day2 and day3 have the same periods but day2 cells show AM|PM|ON temperatures
+    now = datetime(2024, 2, 24, 13, tzinfo=timezone.utc)
+    forecasts = {'Resort 0': parse(now, 0)}
+    state, aggregates = run(now, None, forecasts)
+    setup = utils.TableData(now, 'Resort 0', TIME_PERIODS, PROPERTIES)
+    state.set_row('Resort 0', setup.create_row(setup.calculate_table_data(forecasts['Resort 0'], aggregates['Resort 0'])))
+
+    now = datetime(2024, 2, 25, 15, tzinfo=timezone.utc)
+    forecasts = {'Resort 0': parse(now, 0)}
+    state, aggregates = run(now, json.loads(state.dumps()), forecasts)
+    assert 'day2' not in state.get_slices()['Resort 0']['temperature']
+    assert sorted(state.get_cells('Resort 0').keys()) == ['day3', 'day4', 'day5']
@@ -0,0 +1,67 @@
+### Run in terminal: python3 -m pytest test/test_get_endpoints.py
+
+import json
+from datetime import datetime, timedelta
+import pytz
+import get_endpoints as get_endpoints
+
+now = datetime(2024, 2, 24, 12, 0, 0, tzinfo=pytz.UTC)
+locations = {
+    "Mt. Baker": [[48.8618, -121.6789], [3500, 5000], ["https://www.mtbaker.us/snow-report/"]],
+    "Stevens Pass": [[47.7439, -121.0908], [4061, 5845], ["https://www.stevenspass.com/"]],
+    "Crystal Mountain": [[46.4350, -121.4751], [4600, 7002], ["https://www.crystalmountainresort.com/"]],
+    "White Pass": [[46.6371, -121.3915], [4500, 6500], ["https://skiwhitepass.com/"]]
+    }
+
+def endpoint(x, age):
+    resolved_at = (now - age).strftime('%Y-%m-%dT%H:%M:%SZ')
+    return {'forecastGridData': f'https://api.weather.gov/gridpoints/SEW/{x},50', 'gridId': 'SEW', 'gridX': x, 'gridY': 50,
+            'elevation': None, 'forecastZone': None, 'resolved_at': resolved_at}
+
+def test_endpoint_helpers_read_old_and_new_cache_formats():
+    url = 'https://api.weather.gov/gridpoints/SEW/150,50'
+    assert get_endpoints.endpoint_url(url) == url
+    assert get_endpoints.grid_cell(url) == url
+    assert get_endpoints.endpoint_url(endpoint(150, timedelta(0))) == url
+    assert get_endpoints.grid_cell(endpoint(150, timedelta(0))) == 'SEW/150,50'
+
+def test_check_endpoints_applies_ttl(monkeypatch):
+    monkeypatch.setenv("LOCATIONS", json.dumps(locations))
+    monkeypatch.setenv("ENDPOINT_TTL", str(7 * 24 * 3600))
+    monkeypatch.setenv("ENDPOINT_STALE_TTL", str(30 * 24 * 3600))
+    resolved = []
+
+    def fake_get_endpoints(names=None):
+        resolved.extend(names)
+        return {name: endpoint(1, timedelta(0)) for name in names}
+
+    monkeypatch.setattr(get_endpoints, 'get_endpoints', fake_get_endpoints)
+    cached = {"Mt. Baker": endpoint(150, timedelta(days=1)),
+              "Stevens Pass": endpoint(151, timedelta(days=10)),
+              "Crystal Mountain": 'https://api.weather.gov/gridpoints/SEW/152,50'}
+
+    endpoints, stale, changed = get_endpoints.check_endpoints(cached, now)
+    assert sorted(stale) == ["Crystal Mountain", "Stevens Pass"]
+    assert resolved == ["White Pass"]
+    assert changed == True
+    assert endpoints["Mt. Baker"] == cached["Mt. Baker"]
+    assert endpoints["White Pass"]['gridX'] == 1
+
+    cached["Stevens Pass"] = endpoint(151, timedelta(days=40))
+    endpoints, stale, changed = get_endpoints.check_endpoints(cached, now)
+    assert "Stevens Pass" in resolved
+
+def test_resolve_endpoint_updates_only_failing_location(monkeypatch):
+    monkeypatch.setenv("LOCATIONS", json.dumps(locations))
+    written = []
+    monkeypatch.setattr(get_endpoints, 'get_endpoints', lambda names=None: {name: endpoint(99, timedelta(0)) for name in names})
+    monkeypatch.setattr(get_endpoints.utils, 'writeblob', lambda blob_name, blob_input, *args: written.append((blob_name, json.loads(blob_input))))
+
+    endpoints = {name: endpoint(150 + i, timedelta(days=1)) for i, name in enumerate(locations.keys())}
+    url = get_endpoints.resolve_endpoint("Stevens Pass", endpoints, None)
+
+    assert url == 'https://api.weather.gov/gridpoints/SEW/99,50'
+    assert endpoints["Stevens Pass"]['gridX'] == 99
+    assert endpoints["Mt. Baker"]['gridX'] == 150
+    assert written[0][0] == 'noaa_api_endpoints.json'
+    assert written[0][1] == endpoints
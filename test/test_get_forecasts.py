@@ -0,0 +1,88 @@
+### Run in terminal: python3 -m pytest test/test_get_forecasts.py
+
+import json
+import storage as storage
+import fetch_utils as fetch_utils
+import get_forecasts as get_forecasts
+
+properties = {"temperature": {"units": "degF", "calculations": ["max", "min", "avg"]}}
+endpoints = {'A': 'https://api.weather.gov/gridpoints/A/1,1',
+             'B': 'https://api.weather.gov/gridpoints/B/1,1',
+             'C': 'https://api.weather.gov/gridpoints/C/1,1'}
+
+class Forecast:
+    def __init__(self, not_modified=False):
+        self._not_modified = not_modified
+    def get_status(self):
+        return (200, False)
+    def is_not_modified(self):
+        return self._not_modified
+    def get_blob(self):
+        return b'{}'
+    def get_data(self):
+        return {}
+
+def test_validators_saved_only_for_stored_forecasts(monkeypatch):
+    # D shares the grid cell of A
+    located = dict(endpoints, D=endpoints['A'])
+    monkeypatch.setenv("LOCATIONS", json.dumps({location: {} for location in located.keys()}))
+    monkeypatch.setenv("PROPERTIES", json.dumps(properties))
+    monkeypatch.setenv("STORAGE_BACKEND", "memory")
+    monkeypatch.setenv("GRIDDATA_FORMAT", "json")
+    blob_storage = storage.get_storage()
+    session = fetch_utils.NOAASession({})
+    session.set_validators({url: {'etag': location, 'last_modified': None} for location, url in endpoints.items()})
+    monkeypatch.setattr(fetch_utils, 'get_session', lambda header: session)
+
+    # Upload of B fails, A is written and C is still current
+    write = blob_storage.write_if_changed
+    failing = ['B_gridData.json']
+    def write_if_changed(container_name, blob_name, *args, **kwargs):
+        if blob_name in failing:
+            raise RuntimeError('upload failed')
+        return write(container_name, blob_name, *args, **kwargs)
+    monkeypatch.setattr(blob_storage, 'write_if_changed', write_if_changed)
+
+    forecasts = {'A': Forecast(), 'B': Forecast(), 'C': Forecast(not_modified=True), 'D': Forecast()}
+    def fetch_forecasts(locations, endpoints, header, limiter, workers, session, policy, refresh, properties, compact, fetched):
+        for location, forecast in forecasts.items():
+            fetched(location, forecast)
+        return forecasts
+    monkeypatch.setattr(get_forecasts, 'fetch_forecasts', fetch_forecasts)
+
+    forecast_blobs = get_forecasts.get_forecasts(None, located)
+    assert sorted(forecast_blobs.keys()) == ['A', 'B', 'C', 'D']
+    saved = json.loads(blob_storage.read('skiforecast', 'noaa_validators.json'))
+    assert sorted(saved['validators'].keys()) == [endpoints['A'], endpoints['C']]
+
+    # A url is left out unless the blobs of all its locations are stored
+    failing.append('D_gridData.json')
+    get_forecasts.get_forecasts(None, located)
+    saved = json.loads(blob_storage.read('skiforecast', 'noaa_validators.json'))
+    assert sorted(saved['validators'].keys()) == [endpoints['C']]
+
+def test_validators_of_other_properties_are_ignored(monkeypatch):
+    monkeypatch.setenv("LOCATIONS", json.dumps({location: {} for location in endpoints.keys()}))
+    monkeypatch.setenv("STORAGE_BACKEND", "memory")
+    monkeypatch.setenv("GRIDDATA_FORMAT", "json")
+    blob_storage = storage.get_storage()
+    monkeypatch.setattr(get_forecasts, 'fetch_forecasts', lambda *args: {location: Forecast(not_modified=True) for location in endpoints.keys()})
+
+    def loaded(properties):
+        monkeypatch.setenv("PROPERTIES", json.dumps(properties))
+        session = fetch_utils.NOAASession({})
+        monkeypatch.setattr(fetch_utils, 'get_session', lambda header: session)
+        get_forecasts.get_forecasts(None, endpoints)
+        return session.get_validators()
+
+    # Validators saved without properties are ignored, validators saved under the same properties are loaded
+    validators = {url: {'etag': location, 'last_modified': None} for location, url in endpoints.items()}
+    blob_storage.write('skiforecast', 'noaa_validators.json', json.dumps({'format': 'json', 'validators': validators}))
+    assert loaded(properties) == {}
+    blob = json.loads(blob_storage.read('skiforecast', 'noaa_validators.json'))
+    blob['validators'] = validators
+    blob_storage.write('skiforecast', 'noaa_validators.json', json.dumps(blob))
+    assert loaded(properties) == validators
+
+    # Blobs of other properties hold other data, their validators are ignored
+    assert loaded(dict(properties, snowLevel={"units": "ft", "calculations": ["max"]})) == {}
@@ -0,0 +1,58 @@
+### Run in terminal: python3 -m pytest test/test_json_stream.py
+
+import json
+import json_stream as json_stream
+
+forecast = {
+    'lat_long': [47.7439, -121.0908],
+    'elev': [4061, 5845],
+    'href': ['https://www.stevenspass.com/'],
+    'grid_cell': 'SEW/150,50',
+    'data': {
+        '@context': ['https://geojson.org/geojson-ld/geojson-context.jsonld', {'@version': '1.1'}],
+        'geometry': {'type': 'Polygon', 'coordinates': [[[-121.1, 47.7], [-121.0, 47.8]]]},
+        'properties': {
+            'updateTime': '2024-02-24T11:00:00+00:00',
+            'elevation': {'unitCode': 'wmoUnit:m', 'value': 1234.5},
+            'dewpoint': {'uom': 'wmoUnit:degC', 'values': [{'validTime': '2024-02-24T11:00:00+00:00/PT1H', 'value': -3.3}] * 50},
+            'temperature': {'uom': 'wmoUnit:degC', 'values': [{'validTime': '2024-02-24T11:00:00+00:00/PT2H', 'value': -1.11}] * 50},
+            'weather': {'values': [{'validTime': '2024-02-24T11:00:00+00:00/PT6H',
+                                    'value': [{'coverage': 'likely', 'weather': 'snow', 'intensity': 'light', 'note': 'café ❄ "quoted" }{'}]}]},
+            'snowLevel': {'uom': 'wmoUnit:m', 'values': []},
+            }
+        }
+    }
+
+def chunked(data, size):
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+def test_decode_keeps_selected_properties_only():
+    data = json.dumps(forecast, indent=4).encode()
+    expected = {key: forecast[key] for key in ['lat_long', 'elev', 'href', 'grid_cell']}
+    expected['data'] = {'properties': {key: forecast['data']['properties'][key] for key in ['updateTime', 'elevation', 'temperature', 'weather']}}
+
+    # Chunk sizes split keys, numbers and multi-byte characters across chunks
+    for size in [1, 3, 7, 64, 65536]:
+        decoded = json_stream.decode(chunked(data, size), json_stream.forecast_select(['temperature', 'weather', 'windSpeed']))
+        assert decoded == expected
+
+def test_decode_str_chunks_and_empty_selection():
+    data = json.dumps(forecast['data'])
+    assert json_stream.decode(chunked(data, 5), {}) == {}
+    assert json_stream.decode(chunked(data, 5), json_stream.griddata_select(['snowLevel'])) == \
+        {'properties': {key: forecast['data']['properties'][key] for key in ['updateTime', 'elevation', 'snowLevel']}}
+
+def test_gunzip_streams_compact_forecast_blob():
+    import utils as utils
+    forecast_data = utils.GridData('Stevens Pass', [forecast['lat_long'], forecast['elev'], forecast['href']], None, {}, compact=True)
+    forecast_data._set_data(forecast['data'])
+    blob = forecast_data.get_blob()
+    assert blob[:2] == b'\x1f\x8b'
+
+    decoded = json_stream.decode(json_stream.gunzip(chunked(blob, 16)), json_stream.forecast_select(['temperature']))
+    assert decoded['format_version'] == utils.FORECAST_FORMAT_VERSION
+    assert decoded['data']['properties']['temperature'] == forecast['data']['properties']['temperature']
+
+    # Uncompressed input passes through unchanged
+    plain = json.dumps(forecast).encode()
+    assert b''.join(json_stream.gunzip(chunked(plain, 1))) == plain
@@ -0,0 +1,57 @@
+### Run in terminal: python3 -m pytest test/test_mock_noaa.py
+
+import json
+import argparse
+from datetime import datetime, timezone
+import requests
+import utils as utils
+from test.bench_fetch import run_benchmark
+from test.mock_noaa import MockNOAA, synthetic_griddata
+
+def test_benchmark_retries_and_revalidates_against_mock():
+    args = argparse.Namespace(resorts=6, shared_cells=0.0, fixtures=None, latency=0.0, jitter=0.0, error_rate=0.0,
+                              throttle_rate=0.3, server_rate=0.0, retry_after=0, seed=1, workers=3, rate=100.0, burst=10.0,
+                              max_attempts=6, base_delay=0.01, max_delay=0.05, budget=5, breaker_threshold=1000, breaker_cooldown=0, runs=2, properties=True, compact=True)
+    report = run_benchmark(args)
+    first, second = report['runs']
+
+    assert first['succeeded'] == report['endpoints']['resolved']
+    assert first['requests'].get('gridpoints 429', 0) == first['retry_stats']['retries']
+    assert second['not_modified'] == second['succeeded'] == first['succeeded']
+    assert 'gridpoints 200' not in second['requests']
+
+def test_mock_replays_recorded_fixtures(tmp_path):
+    # A recorded /points response and gridData blobs in both formats written by the pipeline
+    points = {'id': 'https://api.weather.gov/points/47.7439,-121.0908', 'type': 'Feature',
+              'geometry': {'type': 'Point', 'coordinates': [-121.0908, 47.7439]},
+              'properties': {'@id': 'https://api.weather.gov/points/47.7439,-121.0908', 'gridId': 'SEW', 'gridX': 163, 'gridY': 65,
+                             'forecastGridData': 'https://api.weather.gov/gridpoints/SEW/163,65',
+                             'forecastZone': 'https://api.weather.gov/zones/forecast/WAZ568'}}
+    (tmp_path / 'Stevens Pass_points.json').write_text(json.dumps(points))
+    recorded = {}
+    # The compact blob names its cell as grid_cell, the other in the recorded response
+    for i, (location, x, compact) in enumerate([('Stevens Pass', 163, True), ('Mt. Baker', 150, False)]):
+        data = synthetic_griddata(i, datetime(2024, 2, 24, 11, tzinfo=timezone.utc))
+        grid_cell = None
+        if compact:
+            grid_cell = f'SEW/{x},65'
+        else:
+            data['properties'].update({'gridId': 'SEW', 'gridX': x, 'gridY': 65})
+        forecast = utils.GridData(location, [[47.7, -121.1], [4061, 5845], ['']], None, {}, grid_cell=grid_cell, compact=compact)
+        forecast._set_data(data)
+        blob = forecast.get_blob()
+        (tmp_path / utils.forecast_blob_name(location, compact)).write_bytes(blob if compact else blob.encode())
+        recorded[x] = data
+
+    mock = MockNOAA(str(tmp_path))
+    url = mock.start()
+    try:
+        replayed = requests.get(f'{url}/points/47.7439,-121.0908').json()['properties']
+        assert replayed['forecastGridData'] == f'{url}/gridpoints/SEW/163,65'
+        assert requests.get(replayed['forecastGridData']).json() == recorded[163]
+        assert requests.get(f'{url}/gridpoints/SEW/150,65').json() == recorded[150]
+
+        # Points without a recording are synthesized
+        assert requests.get(f'{url}/points/46.5,-121.0').json()['properties']['gridId'] == 'MCK'
+    finally:
+        mock.stop()
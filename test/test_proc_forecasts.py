@@ -0,0 +1,86 @@
+### Run in terminal: python3 -m pytest test/test_proc_forecasts.py
+
+import json
+from datetime import datetime, timezone
+import pytz
+import utils as utils
+import proc_forecasts as proc_forecasts
+from test.mock_noaa import synthetic_griddata, synthetic_locations
+
+time_periods = {"day0": ["24h", "am", "pm", "overnight"], "day1": ["24h"], "day2": ["24h"], "day3": ["24h"], "day4": ["24h"], "day5": ["24h"], "day6": ["24h"]}
+properties = {"temperature": {"units": "degF", "calculations": ["max", "min", "avg"]},
+              "snowfallAmount": {"units": "in", "calculations": ["sum"]},
+              "weather": {"units": "text", "calculations": ["extr_str"]}}
+now = datetime(2024, 2, 24, 13, 8, tzinfo=timezone.utc)
+
+class Credential:
+    def get_token(self, *scopes, **kwargs):
+        raise RuntimeError('no token in tests')
+
+def test_payloads_are_processed_without_reading_blobs(monkeypatch):
+    locations = synthetic_locations(3)
+    monkeypatch.setenv("LOCATIONS", json.dumps(locations))
+    monkeypatch.setenv("TIME_PERIODS", json.dumps(time_periods))
+    monkeypatch.setenv("PROPERTIES", json.dumps(properties))
+    monkeypatch.setenv("BLOB_ACCOUNT_URL", 'https://skiforecast.blob.core.windows.net')
+
+    payloads = {}
+    blobs = {}
+    for i, (location, details) in enumerate(locations.items()):
+        forecast = utils.GridData(location, details, None, {}, compact=True)
+        forecast._set_data(synthetic_griddata(i, datetime(2024, 2, 24, 11, tzinfo=timezone.utc)))
+        payloads[location] = forecast.get_data()
+        blobs[utils.forecast_blob_name(location, True)] = forecast.get_blob()
+    forecasts = {location: utils.forecast_blob_name(location, True) for location in locations.keys()}
+
+    reads = []
+    def streamblob(blob_name, *args):
+        reads.append(blob_name)
+        return [blobs[blob_name]]
+    monkeypatch.setattr(utils, 'streamblob', streamblob)
+
+    credential = Credential()
+    local_time = now.astimezone(pytz.timezone('US/Pacific'))
+    table = proc_forecasts.proc_forecasts(credential, local_time, forecasts, set(), payloads)
+    assert reads == []
+    assert [row[0][0].split('\n')[0] for row in table['rows']] == list(locations.keys())
+
+    # Same rows as reading the persisted blobs back
+    assert proc_forecasts.proc_forecasts(credential, local_time, forecasts)['rows'] == table['rows']
+    assert sorted(reads) == sorted(forecasts.values())
+
+def test_unsupported_format_keeps_previous_row(monkeypatch):
+    locations = synthetic_locations(3)
+    monkeypatch.setenv("LOCATIONS", json.dumps(locations))
+    monkeypatch.setenv("TIME_PERIODS", json.dumps(time_periods))
+    monkeypatch.setenv("PROPERTIES", json.dumps(properties))
+    monkeypatch.setenv("BLOB_ACCOUNT_URL", 'https://skiforecast.blob.core.windows.net')
+
+    payloads = {}
+    for i, (location, details) in enumerate(locations.items()):
+        forecast = utils.GridData(location, details, None, {}, compact=True)
+        forecast._set_data(synthetic_griddata(i, datetime(2024, 2, 24, 11, tzinfo=timezone.utc)))
+        payloads[location] = forecast.get_data()
+    forecasts = {location: utils.forecast_blob_name(location, True) for location in locations.keys()}
+    credential = Credential()
+    local_time = now.astimezone(pytz.timezone('US/Pacific'))
+    previous = proc_forecasts.proc_forecasts(credential, local_time, forecasts, set(), dict(payloads))
+
+    # A forecast in a newer format is not parsed, its row is kept from the previous table
+    newer = list(locations.keys())[1]
+    payloads[newer] = {'format_version': utils.FORECAST_FORMAT_VERSION + 1}
+    reads = []
+    def readblob(blob_name, *args):
+        reads.append(blob_name)
+        if blob_name == 'tableData.json':
+            return json.dumps(previous).encode()
+        raise RuntimeError('no blob in tests')
+    monkeypatch.setattr(utils, 'readblob', readblob)
+    table = proc_forecasts.proc_forecasts(credential, local_time, forecasts, set(), dict(payloads))
+    assert 'tableData.json' in reads
+    assert table['rows'] == previous['rows']
+
+    # Without a previous row the location is left out
+    monkeypatch.setattr(utils, 'readblob', lambda blob_name, *args: b'{}')
+    table = proc_forecasts.proc_forecasts(credential, local_time, forecasts, set(), dict(payloads))
+    assert [row[0][0].split('\n')[0] for row in table['rows']] == [location for location in locations.keys() if location != newer]
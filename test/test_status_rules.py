@@ -0,0 +1,32 @@
+### Run in terminal: python3 -m pytest test/test_status_rules.py
+
+import status_rules as status_rules
+import forecast_model as forecast_model
+
+def location_result(location, elev, data):
+    period = forecast_model.PeriodResult(data, {})
+    return forecast_model.LocationResult(location, [47.7, -121.1], elev, [''], {'day0': forecast_model.DayResult(None, 0, {'24h': period})})
+
+def test_default_rules():
+    rules = status_rules.DEFAULT_RULES['temperature']
+    cells = [{'max': 35, 'min': 20}, {'max': 30, 'min': 9}, {'max': 34, 'min': 20}, {'max': 30, 'min': 14}, {'max': 33, 'min': 15}, {'max': 30}]
+    assert status_rules.evaluate(rules, cells) == [1, 1, 2, 2, 3, None]
+    weather = [status_rules.weather_values([(0, (('rain', None, None),))]), status_rules.weather_values([(0, (('rain', None, None), ('snow', None, None)))]),
+               status_rules.weather_values([(0, forecast_model.NO_WEATHER)]), status_rules.weather_values([])]
+    assert status_rules.evaluate(status_rules.DEFAULT_RULES['weather'], weather) == [1, 2, 3, 3]
+
+def test_score_with_overrides():
+    windy = {'windSpeed': {'rules': [{'status': 1, 'when': [['avg', '>=', 25]]}], 'default': 3}}
+    rules = status_rules.StatusRules({'locations': {'Exposed': windy}})
+    data = {'windSpeed': forecast_model.PropertyResult('mph', {'avg': 30.0}),
+            'snowLevel': forecast_model.PropertyResult('ft', {'min': (0, 3000.0), 'max': (0, 5000.0)})}
+    tables = {'Sheltered': location_result('Sheltered', [4061, 5845], data), 'Exposed': location_result('Exposed', [4061, 5845], data)}
+    rules.score(tables)
+    assert tables['Sheltered'].days['day0'].periods['24h'].status == {'windSpeed': 2, 'snowLevel': 2}
+    assert tables['Exposed'].days['day0'].periods['24h'].status == {'windSpeed': 1, 'snowLevel': 2}
+    assert tables['Exposed'].days['day0'].periods['24h'].overall == 1
+
+    missing = {'snowLevel': forecast_model.PropertyResult('ft', None)}
+    tables = {'High': location_result('High', [6000, 7000], missing)}
+    rules.score(tables)
+    assert tables['High'].days['day0'].periods['24h'].status == {'snowLevel': status_rules.MISSING_SNOW_LEVEL}
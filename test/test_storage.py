@@ -0,0 +1,156 @@
+### Run in terminal: python3 -m pytest test/test_storage.py
+
+import storage as storage
+import utils as utils
+
+account_url = 'https://skiforecast.blob.core.windows.net'
+
+class Credential:
+    def get_token(self, *scopes, **kwargs):
+        raise RuntimeError('no token in tests')
+
+def test_storage_session_reuses_clients():
+    credential = Credential()
+    session = storage.get_storage(account_url, credential)
+    assert storage.get_storage(account_url, credential) is session
+
+    container = session.get_container_client('skiforecast')
+    assert session.get_container_client('skiforecast') is container
+    assert session.get_container_client('$web') is not container
+
+    blob_client = session.get_blob_client('skiforecast', 'tableData.json')
+    assert blob_client.container_name == 'skiforecast'
+    assert blob_client.blob_name == 'tableData.json'
+
+    # A different account or credential replaces the session
+    assert storage.get_storage(account_url, Credential()) is not session
+
+def test_blob_helpers_use_pooled_session(monkeypatch):
+    credential = Credential()
+    session = storage.get_storage(account_url, credential)
+    uploads = []
+
+    class BlobClient:
+        def upload_blob(self, data, overwrite=False, **kwargs):
+            uploads.append(data)
+
+    requested = []
+    monkeypatch.setattr(session, 'get_blob_client', lambda container_name, blob_name: requested.append((container_name, blob_name)) or BlobClient())
+    utils.writeblob('a.json', '{}', 'skiforecast', account_url, credential)
+    utils.writeblob('b.json', '[]', 'skiforecast', account_url, credential)
+
+    assert requested == [('skiforecast', 'a.json'), ('skiforecast', 'b.json')]
+    assert uploads == ['{}', '[]']
+    assert storage.get_storage(account_url, credential) is session
+
+def test_submitted_blob_operations_overlap():
+    import time
+    session = storage.MemoryStorage(workers=4)
+    start = time.perf_counter()
+    futures = [session.submit(time.sleep, 0.1) for _ in range(4)]
+    for future in futures:
+        future.result()
+    assert time.perf_counter() - start < 0.3
+
+def test_local_and_memory_backends(monkeypatch, tmp_path):
+    monkeypatch.setenv("STORAGE_BACKEND", "local")
+    monkeypatch.setenv("STORAGE_PATH", str(tmp_path))
+    local = storage.get_storage()
+    assert isinstance(local, storage.LocalStorage)
+    assert storage.get_storage() is local
+
+    monkeypatch.setenv("STORAGE_BACKEND", "memory")
+    memory = storage.get_storage()
+    assert isinstance(memory, storage.MemoryStorage)
+
+    blob = bytes(range(256)) * (storage.CHUNK_SIZE // 128)
+    for session in [local, memory]:
+        session.write('skiforecast', 'a_gridData.json.gz', blob)
+        session.write('skiforecast', 'tableData.json', '{"rows": []}')
+        session.write('$web', 'ski.html', '<html></html>', content_type = 'text/html')
+        session.write('skiforecast', 'tableData.json', '{"rows": [1]}')
+
+        assert session.read('skiforecast', 'a_gridData.json.gz') == blob
+        assert len(list(session.stream('skiforecast', 'a_gridData.json.gz'))) == 2
+        assert session.read('skiforecast', 'tableData.json') == b'{"rows": [1]}'
+        assert session.list_blobs('skiforecast') == ['a_gridData.json.gz', 'tableData.json']
+        assert session.exists('$web', 'ski.html') and not session.exists('$web', 'missing.html')
+        try:
+            session.stream('skiforecast', 'missing.json')
+            assert False
+        except (KeyError, FileNotFoundError):
+            pass
+
+    # Blob helpers go through the configured backend
+    utils.writeblob('b.json', '[]', 'skiforecast', None, None)
+    assert utils.readblob('b.json', 'skiforecast', None, None) == b'[]'
+    assert (tmp_path / 'skiforecast' / 'tableData.json').read_bytes() == b'{"rows": [1]}'
+
+def test_incomplete_backend_fails_on_creation():
+    class PartialStorage(storage.StorageSession):
+        def read(self, container_name, blob_name):
+            return b''
+    try:
+        PartialStorage()
+        assert False, 'backend without _write created'
+    except TypeError as e:
+        assert '_write' in str(e)
+
+def test_write_if_changed_skips_identical_content(tmp_path):
+    for session in [storage.LocalStorage(str(tmp_path)), storage.MemoryStorage()]:
+        assert session.get_metadata('$web', 'ski.html') == None
+        assert session.write_if_changed('$web', 'ski.html', '<p>a</p>', content_type = 'text/html') == True
+        assert session.get_metadata('$web', 'ski.html')[storage.HASH_KEY] == storage.content_hash(b'<p>a</p>')
+        assert session.write_if_changed('$web', 'ski.html', b'<p>a</p>') == False
+        assert session.write_if_changed('$web', 'ski.html', '<p>b</p>') == True
+        assert session.read('$web', 'ski.html') == b'<p>b</p>'
+
+        # Plain writes drop the stored hash, the next conditional write goes through
+        session.write('$web', 'ski.html', '<p>c</p>')
+        assert storage.HASH_KEY not in session.get_metadata('$web', 'ski.html')
+        assert session.write_if_changed('$web', 'ski.html', '<p>c</p>') == True
+        assert session.list_blobs('$web') == ['ski.html']
+
+def test_identical_forecasts_serialize_to_identical_blobs():
+    details = [[47.7439, -121.0908], [4061, 5845], ['https://www.stevenspass.com/']]
+    blobs = []
+    for _ in range(2):
+        forecast = utils.GridData('Stevens Pass', details, None, {}, compact=True)
+        forecast._set_data({'properties': {'updateTime': '2024-02-24T11:00:00+00:00'}})
+        blobs.append(forecast.get_blob())
+    assert blobs[0] == blobs[1]
+
+def test_manifest_indexes_writes_and_merges_concurrent_updates(monkeypatch, tmp_path):
+    for session in [storage.LocalStorage(str(tmp_path)), storage.MemoryStorage()]:
+        manifest = session.get_manifest('skiforecast')
+        assert manifest.get('tableData.json') == None
+        session.write_if_changed('skiforecast', 'tableData.json', '{"rows": []}')
+        assert manifest.get('tableData.json')['size'] == 12
+        assert manifest.commit() == True
+
+        # Changed blobs are answered by the loaded manifest without a request per blob
+        manifest = session.get_manifest('skiforecast', reload=True)
+        get_metadata = session.get_metadata
+        monkeypatch.setattr(session, 'get_metadata', lambda *args: 1 / 0)
+        assert session.write_if_changed('skiforecast', 'tableData.json', '{"rows": [1]}') == True
+        monkeypatch.setattr(session, 'get_metadata', get_metadata)
+
+        # A matching entry is checked against the blob, which may be overwritten outside the pipeline
+        assert session.write_if_changed('skiforecast', 'tableData.json', '{"rows": [1]}') == False
+        session._write('skiforecast', 'tableData.json', '{}')
+        assert session.write_if_changed('skiforecast', 'tableData.json', '{"rows": [1]}') == True
+        assert session.read('skiforecast', 'tableData.json') == b'{"rows": [1]}'
+
+        # Another writer commits first, staged entries are re-applied on top of its update
+        other = storage.Manifest(session, 'skiforecast').load()
+        other.record('noaa_api_endpoints.json', 'abc', 3)
+        assert other.commit() == True
+        assert manifest.commit() == True
+        entries = storage.Manifest(session, 'skiforecast').load().get_entries()
+        assert sorted(entries.keys()) == ['noaa_api_endpoints.json', 'tableData.json']
+        assert entries['tableData.json']['hash'] == storage.content_hash('{"rows": [1]}')
+
+        # Plain writes drop the entry, the hash is no longer known
+        session.write('skiforecast', 'tableData.json', '{}')
+        assert manifest.get('tableData.json') == None
+        monkeypatch.undo()
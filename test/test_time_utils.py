@@ -0,0 +1,44 @@
+### Run in terminal: python3 -m pytest test/test_time_utils.py
+
+from datetime import datetime, timezone
+import pytz
+import utils as utils
+import aggregation as aggregation
+import time_utils as time_utils
+
+def test_parse_valid_time():
+    assert time_utils.parse_valid_time('2024-02-24T11:00:00+00:00/PT2H') == (1708772400, 7200)
+    assert time_utils.parse_valid_time('2024-02-24T03:00:00-08:00/P1DT6H') == (1708772400, 30 * 3600)
+    assert time_utils.parse_timestamp('2024-02-24T11:00:00Z') == 1708772400
+
+def test_day_index_across_dst():
+    # Clocks spring forward on 2024-03-10, so day1 is 23 hours long
+    now = datetime(2024, 3, 9, 20, tzinfo=timezone.utc)
+    index = time_utils.DayIndex(now)
+    boundaries = index.get_boundaries()
+    assert len(boundaries) == 8
+    assert boundaries[0] == int(datetime(2024, 3, 9, 14, tzinfo=timezone.utc).timestamp())
+    assert boundaries[1] - boundaries[0] == 23 * 3600
+    assert boundaries[2] - boundaries[1] == 24 * 3600
+
+    pacific = pytz.timezone('US/Pacific')
+    six_am = pacific.localize(datetime(2024, 3, 10, 6))
+    assert index.group(int(six_am.timestamp()) - 1) == 'day0'
+    assert index.group(int(six_am.timestamp())) == 'day1'
+    assert index.group(boundaries[0] - 1) == None
+    assert index.group(boundaries[7]) == None
+    assert utils.assign_time_groups(now, six_am) == 'day1'
+
+def test_aggregates_keep_last_day():
+    # A forecast ending before day6 keeps its last day
+    now = datetime(2024, 7, 1, 16, tzinfo=timezone.utc)
+    values = [{'validTime': f'2024-07-0{day}T14:00:00+00:00/PT1H', 'value': day} for day in range(1, 4)]
+    blob_data = {'lat_long': [47.7, -121.1], 'elev': [4061, 5845], 'href': [''],
+                 'data': {'properties': {'temperature': {'uom': 'wmoUnit:degC', 'values': values}}}}
+    properties = {'temperature': {'units': 'degF', 'calculations': ['max']}}
+    time_periods = {f'day{day}': ['24h'] for day in range(7)}
+    parsed = utils.TableData(now, 'Stevens Pass', time_periods, properties).parse_forecast(blob_data)
+    data = aggregation.aggregate_forecasts(now, time_periods, properties, {'Stevens Pass': parsed})['Stevens Pass']['temperature']
+    assert data[('day0', '24h')]['max'] == (int(datetime(2024, 7, 1, 14, tzinfo=timezone.utc).timestamp()), 1)
+    assert data[('day2', '24h')]['max'] == (int(datetime(2024, 7, 3, 14, tzinfo=timezone.utc).timestamp()), 3)
+    assert data[('day3', '24h')] == {'count': 0}
@@ -0,0 +1,166 @@
+import re
+import bisect
+from functools import lru_cache
+from datetime import date, datetime, timedelta
+import pytz
+
+# Forecast days are 24 hours starting at 6am local time
+DAY_START_HOUR = 6
+FORECAST_DAYS = 7
+TIMEZONE = 'US/Pacific'
+
+# Time periods of a forecast day, local hours after midnight of the forecast date
+PERIODS = {'24h': (6, 30), 'am': (6, 12), 'pm': (12, 18), 'overnight': (18, 30)}
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_DURATION = re.compile(r'^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+_OFFSET = re.compile(r'^([+-])(\d{2}):?(\d{2})$')
+
+@lru_cache(maxsize=None)
+def parse_offset(offset):
+    '''Parse an ISO 8601 UTC offset, e.g., '+00:00', '-08:00' or 'Z'
+    Returns:
+        seconds (int) : offset east of UTC, seconds
+    '''
+    if offset == 'Z':
+        return 0
+    match = _OFFSET.match(offset)
+    if match == None:
+        raise ValueError(f'Invalid UTC offset: {offset}')
+    seconds = int(match.group(2)) * 3600 + int(match.group(3)) * 60
+    return -seconds if match.group(1) == '-' else seconds
+
+@lru_cache(maxsize=None)
+def parse_duration(duration):
+    '''Parse an ISO 8601 duration, e.g., 'PT2H' or 'P1DT6H'
+    Returns:
+        seconds (int) : duration, seconds
+    '''
+    match = _DURATION.match(duration)
+    if match == None:
+        raise ValueError(f'Invalid duration: {duration}')
+    days, hours, minutes, seconds = (int(group or 0) for group in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+@lru_cache(maxsize=8192)
+def parse_timestamp(timestamp):
+    '''Parse an ISO 8601 timestamp with UTC offset, e.g., '2024-02-24T11:00:00+00:00'
+    Start times repeat across properties and locations, so parsed values are cached.
+    Returns:
+        epoch (int) : seconds since epoch
+    '''
+    if len(timestamp) < 20 or timestamp[10] != 'T':
+        return int(datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp())
+    days = date(int(timestamp[0:4]), int(timestamp[5:7]), int(timestamp[8:10])).toordinal() - _EPOCH_ORDINAL
+    seconds = int(timestamp[11:13]) * 3600 + int(timestamp[14:16]) * 60 + int(timestamp[17:19])
+    return days * 86400 + seconds - parse_offset(timestamp[19:])
+
+def parse_valid_time(valid_time):
+    '''Parse a NOAA validTime interval
+    Args:
+        valid_time (str) : ISO 8601 start and duration, e.g., '2024-02-24T11:00:00+00:00/PT2H'
+    Returns:
+        tuple (int, int) : start, seconds since epoch, and duration, seconds
+    '''
+    start, _, duration = valid_time.partition('/')
+    if duration == '':
+        raise ValueError(f'Invalid validTime: {valid_time}')
+    return (parse_timestamp(start), parse_duration(duration))
+
+@lru_cache(maxsize=8192)
+def local_datetime(epoch, timezone=TIMEZONE):
+    '''Return seconds since epoch as local datetime, for display'''
+    return datetime.fromtimestamp(epoch, pytz.timezone(timezone))
+
+def day_label(date, time):
+    '''Return display name of a forecast day, e.g., 'Today', 'Tomorrow' or 'Saturday'
+    Args:
+        date (date) : date of the forecast day
+        time (datetime) : current time
+    Returns:
+        label (str) : day name
+    '''
+    if date == time.date():
+        return 'Today'
+    if (date - time.date()).days == 1:
+        return 'Tomorrow'
+    return date.strftime('%A')
+
+def get_day_index(time, timezone=TIMEZONE):
+    '''Return the DayIndex of a run, built once per current time'''
+    return _day_index(time, timezone)
+
+@lru_cache(maxsize=16)
+def _day_index(time, timezone):
+    return DayIndex(time, timezone)
+
+
+
+class DayIndex:
+    '''Boundaries of the forecast days of a run
+    Day N starts at 6am local time N days after the current date and ends at 6am the next day.
+    Boundaries are localized once per run, so days are 23 or 25 hours long across DST changes,
+    and a time is assigned to its day by bisection.
+    '''
+
+    def __init__(self, time, timezone=TIMEZONE, days=FORECAST_DAYS, hour=DAY_START_HOUR):
+        '''Initialize DayIndex object
+        Args:
+            time (datetime) : current time, timezone aware
+            timezone (str) : local timezone of the forecast days
+            days (int) : number of forecast days
+            hour (int) : local hour the forecast days start
+        Returns:
+            None
+        '''
+        tz = pytz.timezone(timezone)
+        current_date = time.astimezone(tz).date()
+        self._tz = tz
+        self._timezone = timezone
+        self._periods = {}
+        self._groups = [f'day{day}' for day in range(days)]
+        self._dates = [current_date + timedelta(days=day) for day in range(days)]
+        self._boundaries = [int(tz.localize(datetime.combine(current_date + timedelta(days=day), datetime.min.time()).replace(hour=hour)).timestamp())
+                            for day in range(days + 1)]
+
+    def get_boundaries(self):
+        '''Return day boundaries, seconds since epoch, one more than the number of days'''
+        return self._boundaries
+
+    def get_groups(self):
+        '''Return time groups, ['day0', 'day1', ...]'''
+        return self._groups
+
+    def get_dates(self):
+        '''Return local dates of the forecast days'''
+        return self._dates
+
+    def get_timezone(self):
+        '''Return local timezone name'''
+        return self._timezone
+
+    def get_period(self, day, period):
+        '''Return start and end of a time period of a day
+        Args:
+            day (int) : day number
+            period (str) : time period, see PERIODS
+        Returns:
+            tuple (int, int) : start and end, seconds since epoch
+        '''
+        key = (day, period)
+        if key not in self._periods:
+            midnight = datetime.combine(self._dates[day], datetime.min.time())
+            self._periods[key] = tuple(int(self._tz.localize(midnight + timedelta(hours=hour)).timestamp()) for hour in PERIODS[period])
+        return self._periods[key]
+
+    def day(self, epoch):
+        '''Return day number of a time, None outside the forecast days'''
+        day = bisect.bisect_right(self._boundaries, epoch) - 1
+        if day < 0 or day >= len(self._groups):
+            return None
+        return day
+
+    def group(self, epoch):
+        '''Return time group of a time, e.g., 'day0', None outside the forecast days'''
+        day = self.day(epoch)
+        return None if day == None else self._groups[day]